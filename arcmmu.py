@@ -0,0 +1,102 @@
+from mmu import MMU
+from collections import OrderedDict
+
+class ArcMMU(MMU):
+    # Adaptive Replacement Cache (Megiddo & Modha, FAST 2003).
+    # T1 holds pages seen once recently and T2 pages seen at least twice; B1 and B2
+    # are ghost lists remembering pages recently evicted from T1 and T2. Hits in the
+    # ghost lists move the target size p of T1 towards whichever list would have hit.
+    collapse_repeats = False    # A second reference promotes a page from T1 to T2
+
+    def __init__(self, frames):
+        self.frames = frames            # Number of frames in memory
+        self.t1 = OrderedDict()         # Resident, seen once: page -> dirty, LRU first
+        self.t2 = OrderedDict()         # Resident, seen more than once: page -> dirty, LRU first
+        self.b1 = OrderedDict()         # Ghosts evicted from T1
+        self.b2 = OrderedDict()         # Ghosts evicted from T2
+        self.p = 0                      # Target size of T1
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
+        self.debug = False
+
+    def is_resident(self, page_number):
+        return page_number in self.t1 or page_number in self.t2
+
+    def _evict(self, lru, ghosts):
+        victim, dirty = lru.popitem(last=False)
+        if ghosts is not None:
+            ghosts[victim] = None
+        if dirty:                               # Write back if the victim page is dirty
+            self.disk_writes += 1
+        self.last_victim = victim
+
+    def _replace(self, in_b2):
+    # Evict from T1 if it is above its target size, else from T2.
+
+        t1_size = len(self.t1)
+        if t1_size and (t1_size > self.p or (in_b2 and t1_size == self.p) or not self.t2):
+            self._evict(self.t1, self.b1)
+        else:
+            self._evict(self.t2, self.b2)
+
+    def _access(self, page_number, is_write):
+        if page_number in self.t1:                  # Second reference: promote to T2
+            self.t2[page_number] = self.t1.pop(page_number) or is_write
+            return
+        if page_number in self.t2:
+            self.t2.move_to_end(page_number)
+            if is_write:
+                self.t2[page_number] = True
+            return
+
+        self.page_faults += 1
+        self.disk_reads += 1
+        if page_number in self.b1:                  # Recently evicted from T1: grow T1
+            self.p = min(self.frames, self.p + max(len(self.b2) // len(self.b1), 1))
+            self._replace(False)
+            del self.b1[page_number]
+            self.t2[page_number] = is_write
+        elif page_number in self.b2:                # Recently evicted from T2: shrink T1
+            self.p = max(0, self.p - max(len(self.b1) // len(self.b2), 1))
+            self._replace(True)
+            del self.b2[page_number]
+            self.t2[page_number] = is_write
+        else:
+            l1 = len(self.t1) + len(self.b1)
+            total = l1 + len(self.t2) + len(self.b2)
+            if l1 == self.frames:
+                if len(self.t1) < self.frames:
+                    self.b1.popitem(last=False)
+                    self._replace(False)
+                else:
+                    self._evict(self.t1, None)      # B1 is empty, so T1's LRU page is dropped outright
+            elif total >= self.frames:
+                if total == 2 * self.frames:
+                    self.b2.popitem(last=False)
+                self._replace(False)
+            self.t1[page_number] = is_write
+
+    def read_memory(self, page_number):
+        self._access(page_number, False)
+
+    def write_memory(self, page_number):
+        self._access(page_number, True)
+
+    def dirty_pages(self):
+    # Resident dirty pages of T1, then of T2, least recently used first.
+
+        return (page_number for lru in (self.t1, self.t2) for page_number, dirty in lru.items() if dirty)
+
+    def set_dirty(self, page_number, dirty):
+        (self.t1 if page_number in self.t1 else self.t2)[page_number] = dirty
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
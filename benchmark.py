@@ -0,0 +1,224 @@
+'''
+* Throughput benchmarks of the MMU classes on synthetic traces.
+* Traces are generated reproducibly from a seed and stored as binary traces, so a
+* benchmark only times the simulation itself. Each (pattern, size, algorithm,
+* frames) point is run a few times and the best time kept. Results can be saved
+* as a baseline and later runs compared against it to flag throughput regressions
+* (or changed simulation results).
+*
+* Patterns:
+*   scan        sequential scan, every reference to a new page
+*   loop        repeated sequential loop over LOOP_PAGES pages
+*   zipf        Zipf-distributed references to a hot set of FOOTPRINT pages
+*   phases      uniform references to PHASE_PAGES pages, shifting every PHASE_LENGTH references
+*   writeheavy  uniform references to FOOTPRINT pages, WRITE_HEAVY_RATIO of them writes
+*
+* Usage: python benchmark.py [--sizes 1e5,1e6] [--save FILE] [--compare FILE] ...
+*
+'''
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from memsim import SIMULATOR_VERSION, create_mmu
+from tracefile import CHUNK_SIZE, iter_binary_trace, write_binary_trace
+
+PATTERNS = ('scan', 'loop', 'zipf', 'phases', 'writeheavy')
+ALGORITHMS = ('lru', 'clock', 'rand')
+DEFAULT_SIZES = (10 ** 5, 10 ** 6)
+DEFAULT_FRAMES = (64, 512, 4096)
+DEFAULT_TRACE_DIR = '.benchtraces'
+
+FOOTPRINT = 1 << 13             # Distinct pages of the zipf and writeheavy patterns
+LOOP_PAGES = 1 << 11
+PHASE_PAGES = 1 << 10
+PHASE_LENGTH = 1 << 16
+ZIPF_EXPONENT = 1.0
+WRITE_RATIO = 0.25
+WRITE_HEAVY_RATIO = 0.8
+
+
+def _zipf_weights():
+    return [1 / rank ** ZIPF_EXPONENT for rank in range(1, FOOTPRINT + 1)]
+
+
+def generate_trace(pattern, count, seed=0, chunk_size=CHUNK_SIZE):
+    """Yields (pages, writes) chunks of a synthetic trace of count references.
+
+    The trace only depends on the pattern, count and seed (and on whether NumPy is
+    installed, which selects the random number generator).
+    """
+    write_ratio = WRITE_HEAVY_RATIO if pattern == 'writeheavy' else WRITE_RATIO
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        if pattern == 'zipf':
+            cdf = np.cumsum(_zipf_weights())
+            cdf /= cdf[-1]
+        for start in range(0, count, chunk_size):
+            index = np.arange(start, min(start + chunk_size, count), dtype=np.int64)
+            if pattern == 'scan':
+                pages = index
+            elif pattern == 'loop':
+                pages = index % LOOP_PAGES
+            elif pattern == 'zipf':
+                pages = np.searchsorted(cdf, rng.random(len(index)))
+            elif pattern == 'phases':
+                pages = (index // PHASE_LENGTH) * PHASE_PAGES + rng.integers(0, PHASE_PAGES, len(index))
+            else:
+                pages = rng.integers(0, FOOTPRINT, len(index))
+            yield pages.astype(np.int64), rng.random(len(index)) < write_ratio
+        return
+
+    rng = random.Random(seed)
+    if pattern == 'zipf':
+        ranks = range(FOOTPRINT)
+        cum_weights = []
+        total = 0
+        for weight in _zipf_weights():
+            total += weight
+            cum_weights.append(total)
+    for start in range(0, count, chunk_size):
+        index = range(start, min(start + chunk_size, count))
+        if pattern == 'scan':
+            pages = list(index)
+        elif pattern == 'loop':
+            pages = [i % LOOP_PAGES for i in index]
+        elif pattern == 'zipf':
+            pages = rng.choices(ranks, cum_weights=cum_weights, k=len(index))
+        elif pattern == 'phases':
+            pages = [(i // PHASE_LENGTH) * PHASE_PAGES + rng.randrange(PHASE_PAGES) for i in index]
+        else:
+            pages = [rng.randrange(FOOTPRINT) for i in index]
+        yield pages, [rng.random() < write_ratio for i in index]
+
+
+def trace_path(pattern, count, seed=0, trace_dir=DEFAULT_TRACE_DIR):
+    """Returns the binary trace of a pattern, generating it on first use."""
+    path = os.path.join(trace_dir, f'{pattern}-{count}-{seed}.bin')
+    if not os.path.exists(path):
+        os.makedirs(trace_dir, exist_ok=True)
+        temporary = path + '.tmp'
+        write_binary_trace(temporary, generate_trace(pattern, count, seed), count)
+        os.replace(temporary, path)
+    return path
+
+
+def time_run(path, algorithm, frames, repeat=3):
+    """Replays a binary trace and returns (best seconds, page faults, disk writes).
+
+    Only process_batch is timed, so trace reading does not count.
+    """
+    best = None
+    for run in range(repeat):
+        mmu = create_mmu(algorithm, frames, seed=0)
+        elapsed = 0.0
+        for pages, writes in iter_binary_trace(path):
+            start = time.perf_counter()
+            mmu.process_batch(pages, writes)
+            elapsed += time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, mmu.get_total_page_faults(), mmu.get_total_disk_writes()
+
+
+def run_benchmarks(patterns, sizes, algorithms, frame_counts, repeat=3, trace_dir=DEFAULT_TRACE_DIR):
+    """Runs every benchmark point and returns {key: measurements}, keyed pattern/size/algorithm/frames."""
+    results = {}
+    for pattern in patterns:
+        for size in sizes:
+            path = trace_path(pattern, size, trace_dir=trace_dir)
+            for algorithm in algorithms:
+                for frames in frame_counts:
+                    seconds, faults, disk_writes = time_run(path, algorithm, frames, repeat)
+                    key = f'{pattern}/{size}/{algorithm}/{frames}'
+                    results[key] = {
+                        'seconds': seconds,
+                        'events_per_second': size / seconds if seconds else None,
+                        'page_faults': faults,
+                        'disk_writes': disk_writes,
+                    }
+                    print(f'{key:<32} {results[key]["events_per_second"] or 0:>12.0f} events/s')
+    return results
+
+
+def environment():
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {'simulator_version': SIMULATOR_VERSION, 'python': platform.python_version(),
+            'implementation': platform.python_implementation(), 'machine': platform.machine(),
+            'numpy': numpy_version}
+
+
+def compare(baseline, results, tolerance=0.1):
+    """Compares results with a saved baseline and returns a list of problems found:
+    throughput more than tolerance below the baseline, or different simulation results."""
+    problems = []
+    for key, measured in results.items():
+        expected = baseline['results'].get(key)
+        if expected is None:
+            continue
+        if (measured['page_faults'], measured['disk_writes']) != (expected['page_faults'], expected['disk_writes']):
+            problems.append(f'{key}: results changed, {expected["page_faults"]} -> {measured["page_faults"]} faults, '
+                            f'{expected["disk_writes"]} -> {measured["disk_writes"]} disk writes')
+        old_rate = expected['events_per_second']
+        new_rate = measured['events_per_second']
+        if old_rate and new_rate and new_rate < old_rate * (1 - tolerance):
+            problems.append(f'{key}: throughput regressed {100 * (1 - new_rate / old_rate):.1f}%, '
+                            f'{old_rate:.0f} -> {new_rate:.0f} events/s')
+    return problems
+
+
+def _list(parse):
+    return lambda value: [parse(item) for item in value.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark MMU throughput on synthetic traces.')
+    parser.add_argument('--patterns', type=_list(str), default=list(PATTERNS),
+                        help=f'comma-separated patterns out of {", ".join(PATTERNS)}')
+    parser.add_argument('--sizes', type=_list(lambda value: int(float(value))), default=list(DEFAULT_SIZES),
+                        help='comma-separated trace sizes in references, e.g. 1e5,1e6,1e7,1e8')
+    parser.add_argument('--algorithms', type=_list(str), default=list(ALGORITHMS))
+    parser.add_argument('--frames', type=_list(int), default=list(DEFAULT_FRAMES))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per point, the best time is kept')
+    parser.add_argument('--trace-dir', default=DEFAULT_TRACE_DIR, help='where generated traces are kept')
+    parser.add_argument('--save', metavar='FILE', help='save the results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare the results with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='throughput drop flagged as a regression (default 0.1 = 10%%)')
+    args = parser.parse_args()
+
+    unknown = set(args.patterns) - set(PATTERNS)
+    if unknown:
+        parser.error(f'unknown patterns: {", ".join(sorted(unknown))}')
+
+    results = run_benchmarks(args.patterns, args.sizes, args.algorithms, args.frames,
+                             args.repeat, args.trace_dir)
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'environment': environment(), 'results': results}, baseline_file, indent=2)
+        print(f"Saved baseline to '{args.save}'")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['environment'] != environment():
+            print(f"Warning: baseline was recorded on {baseline['environment']}")
+        problems = compare(baseline, results, args.tolerance)
+        for problem in problems:
+            print(problem)
+        if problems:
+            sys.exit(1)
+        print(f"No regressions against '{args.compare}'")
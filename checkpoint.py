@@ -0,0 +1,52 @@
+'''
+* Checkpoints of a memsim.py run.
+* A checkpoint holds the state of the MMU (see MMU.get_state), the number of
+* references simulated and the position in the trace after them, so a run can be
+* resumed after an interruption or continued onto data appended to the trace.
+* A digest of the start of the trace data it covers (see tracefile.trace_head)
+* guards against resuming on another trace.
+* Checkpoints are zlib-compressed pickles: only load checkpoints you wrote.
+*
+'''
+import os
+import pickle
+import zlib
+
+from memsim import SIMULATOR_VERSION
+from tracefile import HEAD_SIZE, trace_head
+
+CHECKPOINT_VERSION = 2
+
+
+def save_checkpoint(path, mmu, replacement_mode, frames, events, position, input_file, head=None):
+    """Writes a checkpoint atomically, so an interrupted write leaves the previous one intact.
+
+    head is the (length, digest) returned by the previous call, reused once it
+    covers HEAD_SIZE bytes. Returns the one stored, None for stdin.
+    """
+    if input_file != '-' and (head is None or head[0] < HEAD_SIZE):
+        head = trace_head(input_file, position)
+    checkpoint = {
+        'version': CHECKPOINT_VERSION,
+        'simulator_version': SIMULATOR_VERSION,
+        'replacement_mode': replacement_mode,
+        'frames': frames,
+        'events': events,
+        'position': dict(position),
+        'head': head,                   # (length, digest), None for stdin
+        'state': mmu.get_state(),
+    }
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as out:
+        out.write(zlib.compress(pickle.dumps(checkpoint, pickle.HIGHEST_PROTOCOL)))
+    os.replace(temporary, path)
+    return head
+
+
+def load_checkpoint(path):
+    """Reads a checkpoint. Raises ValueError if it was written by another version."""
+    with open(path, 'rb') as checkpoint_file:
+        checkpoint = pickle.loads(zlib.decompress(checkpoint_file.read()))
+    if (checkpoint.get('version'), checkpoint.get('simulator_version')) != (CHECKPOINT_VERSION, SIMULATOR_VERSION):
+        raise ValueError(f"Checkpoint '{path}' was written by another version of the simulator")
+    return checkpoint
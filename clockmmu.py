@@ -1,76 +1,111 @@
 from mmu import MMU
 
+SHORT_SWEEP = 16    # Hand steps taken one at a time before switching to a bulk scan
+
 class ClockMMU(MMU):
     def __init__(self, frames):
-        self.frames = frames        # Number of frames in memory
-        self.memory = {}            # Memory dictionary to store pages
-        self.page_table = []        # Page table to keep track of pages in memor
-        self.pointer = 0            # Pointer to keep track of the page to replace
+        self.frames = frames                # Number of frames in memory
+        self.memory = {}                    # Page -> frame holding it
+        self.page_table = []                # Frame -> page, one entry per occupied frame
+        self.ref_bits = bytearray(frames)   # Reference bit of each frame
+        self.dirty = bytearray(frames)      # Dirty bit of each frame
+        self.pointer = 0                    # Clock hand: the next frame to consider for replacement
+        self.hand_steps = 0                 # Frames the hand has passed over, for profiling
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
         self.debug = False
 
-    def set_debug(self):
-        self.debug = True
-
-    def reset_debug(self):
-        self.debug = False
-
-    def read_memory(self, page_number):             
+    def read_memory(self, page_number):
     # If the page is in memory, update its reference bit to True.
     # If not, handle the page fault by replacing a page.
 
-        if page_number in self.memory:              
-            self.memory[page_number][1] = True  # Set reference bit to True
-            if self.debug:
-                print(f"Page {page_number} read from memory.")
+        frame = self.memory.get(page_number)
+        if frame is not None:
+            self.ref_bits[frame] = 1            # Set reference bit to True
         else:
             self.page_faults += 1
             self.replace_page(page_number, 'R')     # Handle page fault and load page
 
-    def write_memory(self, page_number):            
+    def write_memory(self, page_number):
     # If the page is in memory, mark it as dirty ('W') and update its reference bit.
     # If not, handle the page fault by replacing a page.
 
-        if page_number in self.memory:              
-            self.memory[page_number][0] = 'W'   # Mark page as written (dirty)
-            self.memory[page_number][1] = True  # Set reference bit to True
-            if self.debug:
-                print(f"Page {page_number} written to memory.")
+        frame = self.memory.get(page_number)
+        if frame is not None:
+            self.dirty[frame] = 1               # Mark page as written (dirty)
+            self.ref_bits[frame] = 1            # Set reference bit to True
         else:
             self.page_faults += 1
             self.replace_page(page_number, 'W') # Handle page fault and load page
 
-    def replace_page(self, page_number, mode):          
+    def _sweep(self, pointer):
+    # Bulk part of a long sweep: move the hand from pointer to the first frame with a
+    # reference bit of 0, clearing the bits it passes over, and return that frame.
+    # bytearray.find() scans the reference bits in C and the passed-over range is
+    # cleared with one slice assignment instead of one step per frame.
+
+        ref_bits = self.ref_bits
+        frame = ref_bits.find(0, pointer)
+        if frame >= 0:
+            ref_bits[pointer:frame] = bytes(frame - pointer)
+            self.hand_steps += frame - pointer
+            return frame
+        ref_bits[pointer:] = bytes(self.frames - pointer)     # No candidate before the end, so wrap around
+        frame = ref_bits.find(0, 0, pointer)
+        if frame < 0:
+            frame = pointer                                     # Every bit was set: a full turn cleared them all
+        ref_bits[:frame] = bytes(frame)
+        self.hand_steps += self.frames - pointer + frame
+        return frame
+
+    def replace_page(self, page_number, mode):
     # If there's an empty frame, load the new page directly.
     # If memory is full, find a page with a reference bit of 0 to replace.
 
-        if len(self.page_table) < self.frames:          # Memory has space, so load the page into the next available slot.          
+        if len(self.page_table) < self.frames:          # Memory has space, so load the page into the next available slot.
+            frame = len(self.page_table)
             self.page_table.append(page_number)
-            self.memory[page_number] = [mode, True]     # Set page mode and reference bit
-            if self.debug:
-                print(f"Page {page_number} loaded into memory.")
         else:                                           # Memory is full, so find a page to replace using the Clock algorithm.
-            while True:
-                current_page = self.page_table[self.pointer]
-                if not self.memory[current_page][1]:            # Reference bit is 0
-                    if self.memory[current_page][0] == 'W':     # Write back if dirty
-                        self.disk_writes += 1
-                        if self.debug:
-                            print(f"Page {current_page} written back to disk.")
-                    del self.memory[current_page]                   # Remove the old page
-                    self.page_table[self.pointer] = page_number     # Replace it with the new page
-                    self.memory[page_number] = [mode, True]         # Set new page mode and reference bit
-                    if self.debug:
-                        print(f"Page {current_page} replaced by page {page_number}.")
-                    self.pointer = (self.pointer + 1) % len(self.page_table)    # Move pointer to the next page
+            ref_bits = self.ref_bits
+            frame = self.pointer
+            steps = 0
+            while ref_bits[frame]:                      # Reference bit is 1, reset it and move to the next frame
+                if steps == SHORT_SWEEP:                # Long sweep, finish it with a bulk scan
+                    frame = self._sweep(frame)
                     break
-                self.memory[current_page][1] = False    # If reference bit is 1, reset it and move pointer to the next page.
-                self.pointer = (self.pointer + 1) % len(self.page_table)
+                ref_bits[frame] = 0
+                steps += 1
+                frame += 1
+                if frame == self.frames:
+                    frame = 0
+            self.hand_steps += steps
+            current_page = self.page_table[frame]
+            if self.dirty[frame]:                       # Write back if dirty
+                self.disk_writes += 1
+            del self.memory[current_page]               # Remove the old page
+            self.page_table[frame] = page_number        # Replace it with the new page
+            self.last_victim = current_page
+            self.pointer = (frame + 1) % self.frames    # Move pointer to the next page
 
+        self.memory[page_number] = frame
+        self.ref_bits[frame] = 1                        # Set new page reference bit
+        self.dirty[frame] = mode == 'W'                 # and mode
         self.disk_reads += 1     # A new page is loaded from the disk, so increment the disk read counter.
 
+    def dirty_pages(self):
+    # Resident dirty pages, in the order the clock hand reaches them.
+
+        occupied = len(self.page_table)
+        for step in range(occupied):
+            frame = (self.pointer + step) % occupied
+            if self.dirty[frame]:
+                yield self.page_table[frame]
+
+    def set_dirty(self, page_number, dirty):
+        self.dirty[self.memory[page_number]] = dirty
+
     def get_total_disk_reads(self):
         return self.disk_reads
 
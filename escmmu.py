@@ -0,0 +1,116 @@
+from mmu import MMU
+
+# Frame classes for enhanced second chance, as (reference bit << 1) | dirty bit:
+# 0 = not referenced, clean (best victim), 1 = not referenced, dirty,
+# 2 = referenced, clean, 3 = referenced, dirty.
+CLEAR_REFERENCE = bytes([0, 1, 0, 1] + [0] * 252)   # translate() table clearing the reference bit
+
+class EscMMU(MMU):
+    def __init__(self, frames):
+        self.frames = frames                # Number of frames in memory
+        self.memory = {}                    # Page -> frame holding it
+        self.page_table = []                # Frame -> page, one entry per occupied frame
+        self.classes = bytearray(frames)    # (reference bit, dirty bit) class of each frame
+        self.pointer = 0                    # Clock hand: the next frame to consider for replacement
+        self.hand_steps = 0                 # Frames the hand has passed over, for profiling
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
+        self.debug = False
+
+    def read_memory(self, page_number):
+    # If the page is in memory, set its reference bit.
+    # If not, handle the page fault by replacing a page.
+
+        frame = self.memory.get(page_number)
+        if frame is not None:
+            self.classes[frame] |= 2            # Set reference bit
+        else:
+            self.page_faults += 1
+            self.replace_page(page_number, 'R')
+
+    def write_memory(self, page_number):
+    # If the page is in memory, set its reference and dirty bits.
+    # If not, handle the page fault by replacing a page.
+
+        frame = self.memory.get(page_number)
+        if frame is not None:
+            self.classes[frame] = 3             # Referenced and dirty
+        else:
+            self.page_faults += 1
+            self.replace_page(page_number, 'W')
+
+    def _find_class(self, wanted, clear_reference):
+    # Scan one full turn from the hand for a frame of the wanted class and return it,
+    # or -1. If clear_reference is set, the frames passed over lose their reference bit.
+
+        classes = self.classes
+        pointer = self.pointer
+        frame = classes.find(wanted, pointer)
+        if frame < 0:
+            frame = classes.find(wanted, 0, pointer)
+        if clear_reference:
+            if frame < 0:
+                classes[:] = classes.translate(CLEAR_REFERENCE)
+            elif frame >= pointer:
+                classes[pointer:frame] = classes[pointer:frame].translate(CLEAR_REFERENCE)
+            else:
+                classes[pointer:] = classes[pointer:].translate(CLEAR_REFERENCE)
+                classes[:frame] = classes[:frame].translate(CLEAR_REFERENCE)
+        if frame >= 0:
+            self.hand_steps += (frame - pointer) % self.frames
+        else:
+            self.hand_steps += self.frames
+        return frame
+
+    def replace_page(self, page_number, mode):
+    # If there's an empty frame, load the new page directly.
+    # If memory is full, prefer a victim that is neither referenced nor dirty:
+    # first look for class (0, 0) without changing any bits, then for (0, 1) while
+    # clearing reference bits, and repeat until one is found.
+
+        if len(self.page_table) < self.frames:          # Memory has space, so load the page into the next available slot.
+            frame = len(self.page_table)
+            self.page_table.append(page_number)
+        else:
+            while True:
+                frame = self._find_class(0, False)
+                if frame >= 0:
+                    break
+                frame = self._find_class(1, True)
+                if frame >= 0:
+                    break
+            current_page = self.page_table[frame]
+            if self.classes[frame] & 1:                 # Write back if dirty
+                self.disk_writes += 1
+            del self.memory[current_page]
+            self.page_table[frame] = page_number
+            self.last_victim = current_page
+            self.pointer = (frame + 1) % self.frames    # Move pointer to the next page
+
+        self.memory[page_number] = frame
+        self.classes[frame] = 3 if mode == 'W' else 2   # Referenced, dirty if written
+        self.disk_reads += 1
+
+    def dirty_pages(self):
+    # Resident dirty pages, in the order the clock hand reaches them.
+
+        occupied = len(self.page_table)
+        for step in range(occupied):
+            frame = (self.pointer + step) % occupied
+            if self.classes[frame] & 1:
+                yield self.page_table[frame]
+
+    def set_dirty(self, page_number, dirty):
+        frame = self.memory[page_number]
+        self.classes[frame] = (self.classes[frame] & 2) | dirty     # Keep the reference bit
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
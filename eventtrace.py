@@ -0,0 +1,148 @@
+'''
+* Structured event tracing for the MMU classes.
+* The MMU classes carry no debug checks on their hot paths. When tracing is switched
+* on with MMU.set_debug(sink), the instance is moved to a traced subclass that wraps
+* read_memory/write_memory and reports each reference as events to a sink:
+*   hit        page referenced while resident        value = 1 for a write, else 0
+*   fault      page loaded after a page fault        value = 1 for a write, else 0
+*   eviction   page removed to make room             value = page being loaded
+*   writeback  evicted page written back to disk     value = page being loaded
+*   hand       clock hand moved during replacement   value = frames passed over
+* Every event also carries the number of the reference (seq) that caused it.
+*
+'''
+import json
+import struct
+
+EVENT_KINDS = ('hit', 'fault', 'eviction', 'writeback', 'hand')
+EVENT_CODES = {kind: code for code, kind in enumerate(EVENT_KINDS)}
+
+
+class PrintSink:
+    # Human-readable messages on stdout, as printed by the original debug mode.
+    def emit(self, seq, kind, page, value):
+        if kind == 'hit':
+            print(f"Page {page} {'written to' if value else 'read from'} memory.")
+        elif kind == 'fault':
+            print(f"Page {page} loaded into memory.")
+        elif kind == 'eviction':
+            print(f"Page {page} replaced by page {value}.")
+        elif kind == 'writeback':
+            print(f"Page {page} written back to disk.")
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    # One JSON object per event, written to a file.
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def emit(self, seq, kind, page, value):
+        self.file.write(json.dumps({'seq': seq, 'event': kind, 'page': page, 'value': value}))
+        self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+class RingBufferSink:
+    # Fixed-size binary ring buffer keeping the most recent events, so tracing a whole
+    # trace costs constant memory. Each record is packed as RECORD.
+    RECORD = struct.Struct('<QBqq')     # seq, event code, page, value
+
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * self.RECORD.size)
+        self.count = 0                  # Events emitted so far
+
+    def emit(self, seq, kind, page, value):
+        offset = (self.count % self.capacity) * self.RECORD.size
+        self.RECORD.pack_into(self.buffer, offset, seq, EVENT_CODES[kind], page, value)
+        self.count += 1
+
+    def records(self):
+        """Returns the buffered events, oldest first, as (seq, kind, page, value) tuples."""
+        kept = min(self.count, self.capacity)
+        first = self.count - kept
+        records = []
+        for index in range(first, self.count):
+            seq, code, page, value = self.RECORD.unpack_from(
+                self.buffer, (index % self.capacity) * self.RECORD.size)
+            records.append((seq, EVENT_KINDS[code], page, value))
+        return records
+
+    def dump(self, path):
+        """Writes the buffered events, oldest first, as packed records."""
+        with open(path, 'wb') as out:
+            for record in self.records():
+                seq, kind, page, value = record
+                out.write(self.RECORD.pack(seq, EVENT_CODES[kind], page, value))
+
+    def close(self):
+        pass
+
+
+class SampledSink:
+    # Forwards the events of one reference in every `period` to another sink, keeping
+    # all events of a sampled reference together.
+    def __init__(self, sink, period):
+        self.sink = sink
+        self.period = period
+
+    def emit(self, seq, kind, page, value):
+        if seq % self.period == 0:
+            self.sink.emit(seq, kind, page, value)
+
+    def close(self):
+        self.sink.close()
+
+
+_traced_classes = {}
+
+
+def traced_class(cls):
+    """Returns the traced variant of an MMU class, creating it on first use."""
+    if getattr(cls, 'traced_base', None) is not None:
+        return cls
+    if cls not in _traced_classes:
+        base_read = cls.read_memory
+        base_write = cls.write_memory
+
+        def traced_access(self, page_number, is_write, access):
+            seq = self.trace_seq
+            self.trace_seq = seq + 1
+            sink = self.sink
+            resident = self.is_resident(page_number)
+            disk_writes = getattr(self, 'disk_writes', 0)
+            hand_steps = getattr(self, 'hand_steps', 0)
+            self.last_victim = None
+
+            access(self, page_number)
+
+            if resident:
+                sink.emit(seq, 'hit', page_number, int(is_write))
+                return
+            steps = getattr(self, 'hand_steps', 0) - hand_steps
+            if steps:
+                sink.emit(seq, 'hand', page_number, steps)
+            victim = self.last_victim
+            if victim is not None:
+                if getattr(self, 'disk_writes', 0) > disk_writes:
+                    sink.emit(seq, 'writeback', victim, page_number)
+                sink.emit(seq, 'eviction', victim, page_number)
+            sink.emit(seq, 'fault', page_number, int(is_write))
+
+        def read_memory(self, page_number):
+            traced_access(self, page_number, False, base_read)
+
+        def write_memory(self, page_number):
+            traced_access(self, page_number, True, base_write)
+
+        _traced_classes[cls] = type('Traced' + cls.__name__, (cls,), {
+            'traced_base': cls,
+            'read_memory': read_memory,
+            'write_memory': write_memory,
+        })
+    return _traced_classes[cls]
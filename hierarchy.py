@@ -0,0 +1,209 @@
+'''
+* Multi-level memory hierarchy: TLB, RAM, an optional compressed tier, backing store.
+* Every reference is translated by a TLB of a fixed number of entries, then looked
+* up in RAM (page frames). Pages evicted from RAM go to a zswap-style compressed
+* pool when there is one; a fault on a page in the pool is served by decompressing
+* it instead of reading the backing store. Pages evicted from the pool are written
+* to the backing store if their contents are not on it yet. The TLB and RAM use any
+* replacement mode of memsim.py; the pool is LRU.
+*
+* Memory sizes are given in bytes, so configurations with different page sizes
+* (e.g. 4K and 2M huge pages) compare the same amount of memory, which must be a
+* whole number of pages of every size, and all of them are simulated in one pass
+* over the trace. TLB entries are not invalidated when RAM evicts a page, so TLB
+* results measure translation locality alone.
+*
+* Usage: python hierarchy.py inputfile --memory 16M --page-sizes 4K,2M [options]
+*
+'''
+from collections import OrderedDict
+import argparse
+import json
+
+from memsim import MODES, create_mmu
+from mmu import collapse_runs
+from tracefile import iter_trace_chunks
+
+UNITS = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+
+# Default costs in microseconds, for the average cost of a reference
+COSTS = {'walk': 0.05, 'compress': 3.0, 'decompress': 1.0, 'read': 100.0, 'write': 200.0}
+
+
+def parse_size(value):
+    """Parses a size such as 4096, 4K, 2M or 1G into bytes."""
+    value = value.strip().upper().rstrip('B')
+    if value and value[-1] in UNITS:
+        return int(float(value[:-1]) * UNITS[value[-1]])
+    return int(value)
+
+
+class Hierarchy:
+    def __init__(self, page_size, memory, policy='lru', tlb_entries=64, tlb_policy='lru',
+                 zswap_bytes=0, compression=3.0, seed=None):
+        if page_size & (page_size - 1):
+            raise ValueError(f"Page size {page_size} is not a power of two")
+        if memory < page_size or memory % page_size:
+            raise ValueError(f"Memory of {memory} bytes is not a whole number of {page_size}-byte pages")
+        self.page_size = page_size
+        self.page_offset = page_size.bit_length() - 1
+        self.frames = memory // page_size
+        self.tlb_entries = tlb_entries
+        if 'opt' in (policy, tlb_policy):
+            raise ValueError("opt needs the whole trace in advance and cannot be used in a hierarchy")
+        # Each tier draws from its own random sequence, so they do not evict in lockstep
+        self.tlb = create_mmu(tlb_policy, tlb_entries, seed)
+        self.ram = create_mmu(policy, self.frames, seed + 1 if seed is not None else None)
+        if self.tlb is None or self.ram is None:
+            raise ValueError(f"Replacement modes must be one of {MODES}")
+        # Compressed pages the pool holds, each taking page_size / compression bytes
+        self.zswap_pages = int(zswap_bytes * compression) // page_size
+        self.zswap = OrderedDict()      # Page -> True if its contents are not on the backing store yet
+        self.unsaved = set()            # Resident pages loaded from the pool with unsaved contents
+        self.references = 0
+        self.zswap_hits = 0
+        self.zswap_stores = 0
+        self.disk_reads = 0
+        self.disk_writes = 0
+
+    def _store(self, victim, dirty):
+        # A page evicted from RAM goes to the pool, which may push its oldest page out
+        self.zswap[victim] = dirty
+        self.zswap_stores += 1
+        if len(self.zswap) > self.zswap_pages:
+            page_number, unsaved = self.zswap.popitem(last=False)
+            if unsaved:
+                self.disk_writes += 1
+
+    def process_batch(self, pages, writes):
+        self.references += len(pages)
+        self.tlb.process_batch(pages, writes)
+        if not self.zswap_pages:
+            self.ram.process_batch(pages, writes)
+            return
+
+        ram = self.ram
+        if ram.collapse_repeats:
+            pages, writes = collapse_runs(pages, writes)
+        else:
+            pages = pages.tolist() if hasattr(pages, 'tolist') else pages
+            writes = writes.tolist() if hasattr(writes, 'tolist') else writes
+        zswap = self.zswap
+        unsaved = self.unsaved
+        for page_number, is_write in zip(pages, writes):
+            faults = ram.page_faults
+            disk_writes = ram.disk_writes
+            ram.last_victim = None
+            if is_write:
+                ram.write_memory(page_number)
+            else:
+                ram.read_memory(page_number)
+            if ram.page_faults == faults:
+                continue
+            # Take the page out of the pool before the victim goes in, which may push
+            # the oldest page out of it
+            if page_number in zswap:
+                self.zswap_hits += 1
+                if zswap.pop(page_number):
+                    unsaved.add(page_number)
+            else:
+                self.disk_reads += 1
+            victim = ram.last_victim
+            if victim is not None:
+                dirty = ram.disk_writes != disk_writes
+                if victim in unsaved:
+                    unsaved.discard(victim)
+                    dirty = True
+                self._store(victim, dirty)
+
+    def stats(self, costs=COSTS):
+        """Returns the results of every tier and the average cost of a reference."""
+        references = self.references or 1
+        tlb_misses = self.tlb.get_total_page_faults()
+        ram_faults = self.ram.get_total_page_faults()
+        if self.zswap_pages:
+            disk_reads, disk_writes = self.disk_reads, self.disk_writes
+        else:
+            disk_reads, disk_writes = ram_faults, self.ram.get_total_disk_writes()
+        time = (tlb_misses * costs['walk'] + self.zswap_stores * costs['compress']
+                + self.zswap_hits * costs['decompress'] + disk_reads * costs['read']
+                + disk_writes * costs['write'])
+        return {
+            'page_size': self.page_size,
+            'tlb': {'entries': self.tlb_entries, 'reach': self.tlb_entries * self.page_size,
+                    'hits': self.references - tlb_misses, 'misses': tlb_misses,
+                    'miss_rate': tlb_misses / references},
+            'ram': {'frames': self.frames, 'hits': self.references - ram_faults, 'faults': ram_faults,
+                    'fault_rate': ram_faults / references},
+            'zswap': {'pages': self.zswap_pages, 'hits': self.zswap_hits, 'stores': self.zswap_stores},
+            'disk': {'reads': disk_reads, 'writes': disk_writes},
+            'references': self.references,
+            'average_cost': time / references,
+        }
+
+
+def simulate_hierarchies(input_file, hierarchies, costs=COSTS):
+    """Runs every hierarchy over the trace in a single pass. Returns their stats."""
+    finest = min(hierarchy.page_offset for hierarchy in hierarchies)
+    for pages, writes in iter_trace_chunks(input_file, finest):
+        for hierarchy in hierarchies:
+            shift = hierarchy.page_offset - finest
+            if not shift:
+                hierarchy.process_batch(pages, writes)
+            elif hasattr(pages, 'dtype'):
+                hierarchy.process_batch(pages >> shift, writes)
+            else:
+                hierarchy.process_batch([page_number >> shift for page_number in pages], writes)
+    return [hierarchy.stats(costs) for hierarchy in hierarchies]
+
+
+def _print_stats(stats):
+    tlb, ram, zswap, disk = stats['tlb'], stats['ram'], stats['zswap'], stats['disk']
+    print(f"page size {stats['page_size']}:")
+    print(f"  tlb: {tlb['entries']} entries, reach {tlb['reach']} bytes, {tlb['hits']} hits, "
+          f"{tlb['misses']} misses, miss rate {tlb['miss_rate']:.4f}")
+    print(f"  ram: {ram['frames']} frames, {ram['hits']} hits, {ram['faults']} faults, "
+          f"fault rate {ram['fault_rate']:.4f}")
+    if zswap['pages']:
+        print(f"  zswap: {zswap['pages']} pages, {zswap['hits']} hits, {zswap['stores']} stores")
+    print(f"  disk: {disk['reads']} reads, {disk['writes']} writes")
+    print(f"  average cost per reference: {stats['average_cost']:.4f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Simulate a TLB, RAM, compressed pool and backing store.')
+    parser.add_argument('inputfile')
+    parser.add_argument('--memory', type=parse_size, required=True, help='RAM size, e.g. 16M')
+    parser.add_argument('--page-sizes', default='4K', help='comma-separated page sizes, e.g. 4K,64K,2M')
+    parser.add_argument('--policy', default='lru', help=f'RAM replacement mode out of {MODES}, except opt')
+    parser.add_argument('--tlb', type=int, default=64, help='TLB entries (default 64)')
+    parser.add_argument('--tlb-policy', default='lru')
+    parser.add_argument('--zswap', type=parse_size, default=0, help='memory of the compressed pool, e.g. 4M')
+    parser.add_argument('--compression', type=float, default=3.0, help='compression ratio of the pool')
+    parser.add_argument('--seed', type=int, default=None, help='seed of randomised policies')
+    parser.add_argument('--tlb-walk', type=float, default=COSTS['walk'], help='microseconds per TLB miss')
+    parser.add_argument('--compress', type=float, default=COSTS['compress'],
+                        help='microseconds to compress a page into the pool')
+    parser.add_argument('--decompress', type=float, default=COSTS['decompress'],
+                        help='microseconds to decompress a page from the pool')
+    parser.add_argument('--read-latency', type=float, default=COSTS['read'],
+                        help='microseconds per backing store read')
+    parser.add_argument('--write-latency', type=float, default=COSTS['write'],
+                        help='microseconds per backing store write')
+    parser.add_argument('--json', metavar='FILE', help='also write the results as JSON')
+    args = parser.parse_args()
+
+    try:
+        hierarchies = [Hierarchy(parse_size(page_size), args.memory, args.policy, args.tlb, args.tlb_policy,
+                                 args.zswap, args.compression, args.seed)
+                       for page_size in args.page_sizes.split(',')]
+    except ValueError as error:
+        parser.error(str(error))
+    costs = {'walk': args.tlb_walk, 'compress': args.compress, 'decompress': args.decompress,
+             'read': args.read_latency, 'write': args.write_latency}
+    results = simulate_hierarchies(args.inputfile, hierarchies, costs)
+    for stats in results:
+        _print_stats(stats)
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=2)
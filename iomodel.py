@@ -0,0 +1,169 @@
+'''
+* I/O timing model of a simulation.
+* Wraps an MMU and follows its faults and evictions on a simulated clock, in
+* microseconds. Every reference costs cpu_time; a page fault reads the page from a
+* device of queue_depth channels, each serving one request at a time, so requests
+* queue behind each other. Dirty evictions are written back either
+*   synchronously  the write must finish before the frame is reused, so the
+*                  faulting reference waits for the write and then the read
+*   asynchronously (flush_batch > 0) the page goes to a modified list that a
+*                  background flusher writes out in batches of flush_batch pages,
+*                  so writes only delay faults by occupying the device
+* With buffer_pages > 0, clean evicted pages (and written modified pages) are kept
+* on a free list of that many frames, as with VAX/VMS page buffering: a fault on a
+* page still on the free or modified list is a soft fault, reclaimed without a read.
+* A page reclaimed from the modified list is taken off it and reloaded dirty.
+* With clean_batch > 0 a background cleaner pre-cleans resident pages: every
+* clean_interval it writes back up to clean_batch dirty pages nearest replacement
+* (see MMU.dirty_pages) and clears their dirty bits, so evicting them later costs
+* no write. The MMU then only counts the writes of pages evicted dirty; device
+* writes include the pre-cleaning ones.
+*
+'''
+from collections import OrderedDict
+import heapq
+import itertools
+
+from mmu import collapse_runs
+
+
+class Device:
+    # Backing store serving requests first come first served on parallel channels
+    def __init__(self, queue_depth=1):
+        self.free_at = [0.0] * queue_depth     # Heap of times the channels become idle
+
+    def submit(self, now, latency):
+        """Queues a request at time now and returns the time it completes."""
+        done = max(now, self.free_at[0]) + latency
+        heapq.heapreplace(self.free_at, done)
+        return done
+
+    def idle_at(self):
+        return max(self.free_at)
+
+
+class IoModel:
+    def __init__(self, mmu, read_latency=100.0, write_latency=200.0, cpu_time=0.1, queue_depth=1,
+                 flush_batch=0, buffer_pages=0, reclaim_time=1.0, clean_batch=0, clean_interval=1000.0):
+        self.mmu = mmu
+        self.read_latency = read_latency
+        self.write_latency = write_latency
+        self.cpu_time = cpu_time            # Time of a reference that does not fault
+        self.reclaim_time = reclaim_time    # Time to reclaim a page from the free or modified list
+        self.flush_batch = flush_batch      # Pages written per flush, 0 for synchronous write-back
+        self.buffer_pages = buffer_pages    # Size of the free list
+        self.clean_batch = clean_batch      # Resident dirty pages pre-cleaned per run, 0 for none
+        self.clean_interval = clean_interval
+        self.next_clean = clean_interval    # Time of the next run of the cleaner
+        self.device = Device(queue_depth)
+        self.free_list = OrderedDict()      # Clean evicted pages, oldest first
+        self.modified = OrderedDict()       # Dirty evicted pages waiting for the flusher
+        self.now = 0.0
+        self.stall_time = 0.0               # Time references spent waiting for the device
+        self.references = 0
+        self.soft_faults = 0
+        self.precleaned = 0
+        self.device_reads = 0
+        self.device_writes = 0
+
+    def _release(self, page_number):
+        # A clean page leaves memory, onto the free list when there is one
+        if self.buffer_pages:
+            self.free_list[page_number] = None
+            self.free_list.move_to_end(page_number)
+            if len(self.free_list) > self.buffer_pages:
+                self.free_list.popitem(last=False)
+
+    def _flush(self):
+        # Write the modified list in the background, after which its pages are clean
+        for page_number in self.modified:
+            self.device.submit(self.now, self.write_latency)
+            self._release(page_number)
+        self.device_writes += len(self.modified)
+        self.modified.clear()
+
+    def _clean(self):
+        # Write back the resident dirty pages nearest replacement while they are still resident
+        mmu = self.mmu
+        for page_number in list(itertools.islice(mmu.dirty_pages(), self.clean_batch)):
+            self.device.submit(self.now, self.write_latency)
+            mmu.set_dirty(page_number, False)
+            self.precleaned += 1
+            self.device_writes += 1
+        self.next_clean = self.now + self.clean_interval
+
+    def _fault(self, page_number, victim, dirty):
+        now = self.now
+        if victim is not None:
+            if not dirty:
+                self._release(victim)
+            elif self.flush_batch:
+                self.modified[victim] = None
+                self.modified.move_to_end(victim)
+                if len(self.modified) >= self.flush_batch:
+                    self._flush()
+            else:
+                now = self.device.submit(now, self.write_latency)
+                self.device_writes += 1
+                self._release(victim)
+
+        if page_number in self.free_list:
+            del self.free_list[page_number]
+            self.soft_faults += 1
+            now += self.reclaim_time
+        elif page_number in self.modified:
+            # Reclaimed before the flusher got to it, with its contents still unsaved
+            del self.modified[page_number]
+            self.mmu.set_dirty(page_number, True)
+            self.soft_faults += 1
+            now += self.reclaim_time
+        else:
+            now = self.device.submit(now, self.read_latency)
+            self.device_reads += 1
+        self.stall_time += now - self.now
+        self.now = now
+
+    def process_batch(self, pages, writes):
+        mmu = self.mmu
+        count = len(pages)
+        if mmu.collapse_repeats and not mmu.debug:
+            pages, writes = collapse_runs(pages, writes)
+        else:
+            if hasattr(pages, 'tolist'):
+                pages = pages.tolist()
+            if hasattr(writes, 'tolist'):
+                writes = writes.tolist()
+        self.references += count
+        self.now += (count - len(pages)) * self.cpu_time    # Collapsed repeats are hits
+        cpu_time = self.cpu_time
+        for page_number, is_write in zip(pages, writes):
+            self.now += cpu_time
+            faults = mmu.page_faults
+            disk_writes = mmu.disk_writes
+            mmu.last_victim = None
+            if is_write:
+                mmu.write_memory(page_number)
+            else:
+                mmu.read_memory(page_number)
+            if mmu.page_faults != faults:
+                self._fault(page_number, mmu.last_victim, mmu.disk_writes != disk_writes)
+            if self.clean_batch and self.now >= self.next_clean:
+                self._clean()
+
+    def finish(self):
+        """Flushes the pages left on the modified list."""
+        self._flush()
+
+    def report(self):
+        """Returns the timing results, with times in microseconds."""
+        elapsed = max(self.now, self.device.idle_at())
+        return {'soft_faults': self.soft_faults, 'precleaned': self.precleaned, 'device_reads': self.device_reads,
+                'device_writes': self.device_writes, 'stall_time': self.stall_time,
+                'simulated_time': elapsed,
+                'throughput': self.references / elapsed * 1e6 if elapsed else 0.0}
+
+    def get_total_page_faults(self):
+        return self.mmu.get_total_page_faults()
+
+    def get_total_disk_writes(self):
+        return self.mmu.get_total_disk_writes()
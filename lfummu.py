@@ -0,0 +1,73 @@
+from mmu import MMU
+from collections import OrderedDict
+
+class LfuMMU(MMU):
+    # Least frequently used replacement with O(1) operations: resident pages are kept
+    # in buckets by reference count, each bucket in LRU order to break ties, and the
+    # smallest non-empty count is tracked so the victim is found without searching.
+    collapse_repeats = False    # Every reference counts towards the page's frequency
+
+    def __init__(self, frames):
+        self.frames = frames            # Number of frames in memory
+        self.memory = {}                # Page -> reference count
+        self.buckets = {}               # Reference count -> OrderedDict of page -> dirty, LRU first
+        self.min_count = 0              # Smallest reference count of a resident page
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
+        self.debug = False
+
+    def _access(self, page_number, is_write):
+        count = self.memory.get(page_number)
+        if count is not None:
+            bucket = self.buckets[count]
+            dirty = bucket.pop(page_number) or is_write
+            if not bucket:
+                del self.buckets[count]
+                if self.min_count == count:
+                    self.min_count = count + 1
+            self.memory[page_number] = count + 1
+            self.buckets.setdefault(count + 1, OrderedDict())[page_number] = dirty
+            return
+
+        self.page_faults += 1
+        if len(self.memory) >= self.frames:         # Memory is full, so replace a least frequently used page
+            bucket = self.buckets[self.min_count]
+            victim, dirty = bucket.popitem(last=False)
+            if not bucket:
+                del self.buckets[self.min_count]
+            del self.memory[victim]
+            if dirty:                               # Write back if the victim page is dirty
+                self.disk_writes += 1
+            self.last_victim = victim
+        self.memory[page_number] = 1
+        self.buckets.setdefault(1, OrderedDict())[page_number] = is_write
+        self.min_count = 1
+        self.disk_reads += 1
+
+    def read_memory(self, page_number):
+        self._access(page_number, False)
+
+    def write_memory(self, page_number):
+        self._access(page_number, True)
+
+    def dirty_pages(self):
+    # Resident dirty pages, least frequently used first.
+
+        for count in sorted(self.buckets):
+            for page_number, dirty in self.buckets[count].items():
+                if dirty:
+                    yield page_number
+
+    def set_dirty(self, page_number, dirty):
+        self.buckets[self.memory[page_number]][page_number] = dirty
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
@@ -8,12 +8,7 @@ class LruMMU(MMU):
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
-        self.debug = False
-
-    def set_debug(self):
-        self.debug = True
-
-    def reset_debug(self):
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
         self.debug = False
 
     def read_memory(self, page_number):
@@ -22,20 +17,15 @@ class LruMMU(MMU):
  
         if page_number in self.memory:                   
             self.memory.move_to_end(page_number)            # Mark page as recently used
-            if self.debug:
-                print(f"Page {page_number} read from memory.")
         else:
             self.page_faults += 1
             if len(self.memory) >= self.frames:                  # Memory is full, so replace the least recently used page (first item in OrderedDict).
                 victim, status = self.memory.popitem(last=False)
                 if status == 'W':                                # Write back if the victim page is dirty
                     self.disk_writes += 1
-                if self.debug:
-                    print(f"Page {victim} replaced by page {page_number}.")
+                self.last_victim = victim
             self.memory[page_number] = 'R'                       # Load the new page with read status
             self.disk_reads += 1
-            if self.debug:
-                print(f"Page {page_number} loaded into memory.")
 
     def write_memory(self, page_number):
     # If the page is in memory, mark it as dirty and move it to the end to mark it as recently used.
@@ -44,20 +34,23 @@ class LruMMU(MMU):
         if page_number in self.memory:
             self.memory[page_number] = 'W'          # Mark page as written (dirty)
             self.memory.move_to_end(page_number)    # Mark page as recently used
-            if self.debug:
-                print(f"Page {page_number} written to memory.")
         else:
             self.page_faults += 1
             if len(self.memory) >= self.frames:          # Memory is full, so replace the least recently used page.
                 victim, status = self.memory.popitem(last=False)
                 if status == 'W':                        # Write back if the victim page is dirty
                     self.disk_writes += 1
-                if self.debug:
-                    print(f"Page {victim} replaced by page {page_number}.")
+                self.last_victim = victim
             self.memory[page_number] = 'W'               # Load the new page with write status
             self.disk_reads += 1
-            if self.debug:
-                print(f"Page {page_number} loaded into memory.")
+
+    def dirty_pages(self):
+    # Resident dirty pages, least recently used first.
+
+        return (page_number for page_number, status in self.memory.items() if status == 'W')
+
+    def set_dirty(self, page_number, dirty):
+        self.memory[page_number] = 'W' if dirty else 'R'    # Assigning keeps the LRU position
 
     def get_total_disk_reads(self):
         return self.disk_reads
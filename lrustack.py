@@ -0,0 +1,158 @@
+from mmu import MMU, collapse_runs
+from tracefile import iter_trace_chunks
+
+class LruStackMMU(MMU):
+    # One-pass LRU simulation for every frame count at once (Mattson stack distances).
+    # LRU has the inclusion property: a cache of C frames always holds the C most
+    # recently used pages, so a reference hits iff its stack distance is <= C.
+    # Stack distances are counted with a Fenwick tree indexed by last access time.
+    def __init__(self, frames=None):
+        self.frames = frames            # Default frame count reported by get_total_*
+        self.last_access = {}           # page -> time of its most recent reference
+        self.dirty_from = {}            # page -> smallest frame count in which the page is dirty
+        self.distances = {}             # stack distance -> number of references at that distance
+        self.writeback_diff = {}        # difference array of dirty evictions over frame counts
+        self.cold_misses = 0
+        self.events = 0
+        self.clock = 0                  # Current time, i.e. last used Fenwick index
+        self.capacity = 1024
+        self.tree = [0] * (self.capacity + 1)
+        self.debug = False
+
+    def is_resident(self, page_number):
+        return page_number in self.last_access
+
+    def _add(self, index, delta):
+        tree = self.tree
+        while index <= self.capacity:
+            tree[index] += delta
+            index += index & -index
+
+    def _prefix(self, index):
+        tree = self.tree
+        total = 0
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+    def _compact(self):
+    # Renumber the last access times of resident pages as 1..D so the tree never
+    # grows beyond twice the number of distinct pages, however long the trace is.
+
+        order = sorted(self.last_access, key=self.last_access.get)
+        self.capacity = max(1024, 2 * len(order))
+        self.tree = [0] * (self.capacity + 1)
+        for time, page in enumerate(order, 1):
+            self.last_access[page] = time
+            self.tree[time] = 1
+        for index in range(1, self.capacity + 1):     # Linear-time Fenwick build
+            parent = index + (index & -index)
+            if parent <= self.capacity:
+                self.tree[parent] += self.tree[index]
+        self.clock = len(order)
+
+    def _writeback_range(self, low, high, diff):
+    # Count one dirty eviction for every frame count C with low <= C < high.
+
+        if low < high:
+            diff[low] = diff.get(low, 0) + 1
+            diff[high] = diff.get(high, 0) - 1
+
+    def _access(self, page_number, is_write):
+        if self.clock >= self.capacity:
+            self._compact()
+        self.events += 1
+        self.clock += 1
+
+        last = self.last_access.get(page_number)
+        if last is None:
+            self.cold_misses += 1
+            distance = None
+        else:
+            distance = len(self.last_access) - self._prefix(last) + 1
+            self.distances[distance] = self.distances.get(distance, 0) + 1
+            self._add(last, -1)
+            # Every frame count below the distance evicted the page since its last use.
+            dirty_from = self.dirty_from.get(page_number)
+            if dirty_from is not None:
+                self._writeback_range(dirty_from, distance, self.writeback_diff)
+
+        self.last_access[page_number] = self.clock
+        self._add(self.clock, 1)
+
+        if is_write:
+            self.dirty_from[page_number] = 1        # Resident, and now dirty, for every frame count
+        elif distance is None:
+            self.dirty_from.pop(page_number, None)  # Loaded clean everywhere
+        elif page_number in self.dirty_from:
+            # Frame counts that missed reloaded the page clean; hits keep their dirty bit.
+            self.dirty_from[page_number] = max(self.dirty_from[page_number], distance)
+
+
+    def process_batch(self, pages, writes):
+    # Collapsed repeats are distance-1 hits for every frame count, so only the
+    # event count needs to include them.
+
+        events = self.events + len(pages)
+        if not self.debug:
+            pages, writes = collapse_runs(pages, writes)
+        for page_number, is_write in zip(pages, writes):
+            self._access(page_number, is_write)
+        self.events = events
+
+    def read_memory(self, page_number):
+        self._access(page_number, False)
+
+    def write_memory(self, page_number):
+        self._access(page_number, True)
+
+    def get_curve(self, frame_counts):
+    # Return {frames: (disk_reads, disk_writes, page_faults)} for each requested frame count.
+    # Pages still dirty at the end of the trace have been evicted from every frame count
+    # below their current stack depth, so those write-backs are added here as well.
+
+        diff = dict(self.writeback_diff)
+        resident = len(self.last_access)
+        for page_number, dirty_from in self.dirty_from.items():
+            depth = resident - self._prefix(self.last_access[page_number]) + 1
+            self._writeback_range(dirty_from, depth, diff)
+
+        distances = sorted(self.distances)
+        diff_keys = sorted(diff)
+        total_hits = sum(self.distances.values())
+        curve = {}
+        hits = writebacks = 0
+        d = w = 0
+        for frames in sorted(frame_counts):
+            while d < len(distances) and distances[d] <= frames:
+                hits += self.distances[distances[d]]
+                d += 1
+            while w < len(diff_keys) and diff_keys[w] <= frames:
+                writebacks += diff[diff_keys[w]]
+                w += 1
+            faults = self.cold_misses + total_hits - hits
+            curve[frames] = (faults, writebacks, faults)
+        return curve
+
+    def get_total_disk_reads(self):
+        return self.get_curve([self.frames])[self.frames][0]
+
+    def get_total_disk_writes(self):
+        return self.get_curve([self.frames])[self.frames][1]
+
+    def get_total_page_faults(self):
+        return self.get_curve([self.frames])[self.frames][2]
+
+
+def lru_curve(input_file, frame_counts, page_offset=12):
+    # Replay a trace once and return the LRU results for every frame count,
+    # as {frames: (disk_reads, disk_writes, page_fault_rate)}.
+
+    mmu = LruStackMMU()
+    for pages, writes in iter_trace_chunks(input_file, page_offset):
+        mmu.process_batch(pages, writes)
+
+    curve = mmu.get_curve(frame_counts)
+    return {frames: (reads, writes, faults / mmu.events)
+            for frames, (reads, writes, faults) in curve.items()}
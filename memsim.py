@@ -1,8 +1,133 @@
+from arcmmu import ArcMMU
+from eventtrace import JsonlSink, PrintSink, RingBufferSink, SampledSink
+from profiling import Profiler
+from windowmetrics import WindowMetrics
 from clockmmu import ClockMMU
+from escmmu import EscMMU
+from iomodel import IoModel
+from lfummu import LfuMMU
 from lrummu import LruMMU
+from multimmu import POLICIES, SCOPES, MultiProcessMMU
+from optmmu import OptMMU
 from randmmu import RandMMU
+from twoqmmu import TwoQMMU
+from tracefile import (TraceFormatError, iter_pid_trace_chunks, iter_trace_chunks, new_position, open_trace,
+                       trace_head_digest)
 
 import sys
+import time
+
+# Bump whenever a change alters simulation results, to invalidate cached results
+SIMULATOR_VERSION = 3
+
+MODES = "[rand, lru, esc, clock, opt, arc, 2q, lfu]"
+
+# Optional "--name value" arguments accepted after the four positional ones
+OPTIONS = {
+    'events': 'file receiving structured MMU events as JSON lines (binary records with --ring)',
+    'ring': 'keep only the last n events in a binary ring buffer, written to the events file at the end',
+    'sample': 'trace only one reference in every n',
+    'profile': 'file receiving a JSON report of phase timings, throughput and peak memory',
+    'progress': 'print a progress line with an ETA to stderr every n seconds',
+    'metrics': 'file receiving per-window faults, writebacks, working set and reuse distances as JSON columns',
+    'window': 'references per metrics window (default 10000)',
+    'scope': 'global, fixed or proportional: replay a PID-tagged trace with per-process page tables sharing the frames',
+    'quota': 'pid:frames[,pid:frames...] fixed frame quotas for --scope fixed',
+    'read-latency': 'model I/O timing: microseconds to read a page (default 100)',
+    'write-latency': 'model I/O timing: microseconds to write a page back (default 200)',
+    'queue': 'model I/O timing: requests the device serves in parallel (default 1)',
+    'flush': 'model I/O timing: write dirty evictions back in the background, n pages at a time',
+    'buffer': 'model I/O timing: keep n evicted pages on a free list to reclaim without a read',
+    'clean': 'model I/O timing: pre-clean up to n resident dirty pages nearest replacement in the background',
+    'clean-interval': 'model I/O timing: microseconds between runs of the pre-cleaner (default 1000)',
+    'checkpoint': 'file receiving a checkpoint of the simulation at the end of the trace',
+    'checkpoint-every': 'also write the checkpoint every n references',
+    'resume': 'checkpoint to continue from, onto the rest of the trace (e.g. data appended since)',
+}
+# Numeric options: (type, smallest value allowed)
+NUMERIC_OPTIONS = {
+    'ring': (int, 1), 'sample': (int, 1), 'progress': (float, 0), 'window': (int, 1),
+    'read-latency': (float, 0), 'write-latency': (float, 0), 'queue': (int, 1), 'flush': (int, 0),
+    'buffer': (int, 0), 'clean': (int, 0), 'clean-interval': (float, 0), 'checkpoint-every': (int, 1),
+}
+IO_OPTIONS = ('read-latency', 'write-latency', 'queue', 'flush', 'buffer', 'clean', 'clean-interval')
+
+
+def create_mmu(replacement_mode, frames, seed=None, pages=None):
+    # Setup MMU based on replacement mode, or return None for an unknown mode.
+    # The seed only affects randomised policies; opt needs every page number of
+    # the trace up front.
+    if replacement_mode == "rand":
+        return RandMMU(frames, seed)
+    elif replacement_mode == "lru":
+        return LruMMU(frames)
+    elif replacement_mode == "clock":
+        return ClockMMU(frames)
+    elif replacement_mode == "esc":
+        return EscMMU(frames)
+    elif replacement_mode == "opt":
+        return OptMMU(frames, pages)
+    elif replacement_mode == "arc":
+        return ArcMMU(frames)
+    elif replacement_mode == "2q":
+        return TwoQMMU(frames)
+    elif replacement_mode == "lfu":
+        return LfuMMU(frames)
+    return None
+
+
+def parse_options(args):
+    # Parse the optional arguments into a dict, with numeric values and quotas
+    # converted, or return None if they are malformed
+    if len(args) % 2:
+        return None
+    options = {}
+    for name, value in zip(args[::2], args[1::2]):
+        if not name.startswith('--') or name[2:] not in OPTIONS:
+            return None
+        name = name[2:]
+        try:
+            if name in NUMERIC_OPTIONS:
+                convert, smallest = NUMERIC_OPTIONS[name]
+                value = convert(value)
+                if value < smallest:
+                    return None
+            elif name == 'quota':
+                value = parse_quotas(value)
+        except ValueError:
+            return None
+        options[name] = value
+    return options
+
+
+def print_options():
+    print("Options:")
+    for name, description in OPTIONS.items():
+        print(f"  --{name} value: {description}")
+
+
+def create_sink(options):
+    # Build the event sink selected by the options; debug mode prints by default
+    if 'ring' in options:
+        sink = RingBufferSink(options['ring'])
+    elif 'events' in options:
+        sink = JsonlSink(options['events'])
+    else:
+        sink = PrintSink()
+    if 'sample' in options:
+        sink = SampledSink(sink, options['sample'])
+    return sink
+
+
+def parse_quotas(value):
+    # Parse "pid:frames,pid:frames" into {pid: frames}
+    quotas = {}
+    for quota in value.split(','):
+        pid, quota_frames = quota.split(':')
+        quotas[int(pid)] = int(quota_frames)
+        if quotas[int(pid)] < 1:
+            raise ValueError(f"Quota of process {pid} must be at least one frame")
+    return quotas
 
 
 def main():
@@ -19,13 +144,25 @@ def main():
     input_file = sys.argv[1]
 
     try:
-        with open(input_file, 'r') as file:
-            # Read the trace file contents
-            trace_contents = file.readlines()
+        # Only check the trace can be opened, it is streamed once by the main loop
+        if input_file != '-':
+            open_trace(input_file).close()
     except FileNotFoundError:
         print(f"Input '{input_file}' could not be found")
         print("Usage: python memsim.py inputfile numberframes replacementmode debugmode")
         return
+    except ValueError as error:
+        print(error)        # e.g. a zstd trace without the zstandard package
+        return
+
+    options = parse_options(sys.argv[5:])
+    if options is None:
+        print("Usage: python memsim.py inputfile numberframes replacementmode debugmode")
+        print_options()
+        return
+    if 'ring' in options and 'events' not in options:
+        print("--ring needs --events, the file the ring buffer is written to")
+        return
 
     frames = int(sys.argv[2])
     if frames < 1:
@@ -34,60 +171,209 @@ def main():
 
     replacement_mode = sys.argv[3]
 
-    # Setup MMU based on replacement mode
-    if replacement_mode == "rand":
-        mmu = RandMMU(frames)
-    elif replacement_mode == "lru":
-        mmu = LruMMU(frames)
-    elif replacement_mode == "esc" or replacement_mode == "clock":
-        mmu = ClockMMU(frames)
+    # A PID-tagged trace is replayed with several processes sharing the frames
+    scope = options.get('scope')
+    if scope is not None and (scope not in SCOPES or replacement_mode not in POLICIES):
+        print(f"--scope must be one of [{', '.join(SCOPES)}], with replacement mode [{', '.join(POLICIES)}]")
+        return
+    if 'quota' in options and scope != 'fixed':
+        print("--quota only applies to --scope fixed")
+        return
+    if 'quota' in options and sum(options['quota'].values()) > frames:
+        print(f"--quota reserves more than the {frames} frames")
+        return
+    if scope is not None and ('metrics' in options or any(name in options for name in IO_OPTIONS)):
+        print("--metrics and I/O timing cannot be combined with --scope")
+        return
+    checkpointing = 'checkpoint' in options or 'resume' in options
+    if checkpointing and (scope is not None or replacement_mode == "opt" or 'metrics' in options
+                          or any(name in options for name in IO_OPTIONS)):
+        print("--checkpoint and --resume cannot be combined with opt, --scope, --metrics or I/O timing")
+        return
+
+    # Phase timings and progress are only collected when asked for
+    profiler = None
+    if 'profile' in options or 'progress' in options:
+        profiler = Profiler(options.get('progress'))
+    progress = profiler.progress if profiler is not None else None
+
+    # opt looks into the future, so the whole trace is read before simulating
+    trace_chunks = None
+    future_pages = None
+    if replacement_mode == "opt":
+        try:
+            trace_chunks = list(iter_trace_chunks(input_file, PAGE_OFFSET))
+        except TraceFormatError as error:
+            print(error)
+            return
+        future_pages = [page_number for pages, writes in trace_chunks for page_number in pages]
+        if profiler is not None:
+            profiler.total_events = len(future_pages)
+
+    if scope is not None:
+        mmu = MultiProcessMMU(frames, replacement_mode, scope, options.get('quota'))
     else:
-        print("Invalid replacement mode. Valid options are [rand, lru, esc, clock]")
+        mmu = create_mmu(replacement_mode, frames, pages=future_pages)
+    if mmu is None:
+        print(f"Invalid replacement mode. Valid options are {MODES}")
         return
 
+    # Continue from a checkpoint: restore the MMU and skip the part of the trace it covers
+    no_events = 0
+    position = None
+    if checkpointing:
+        from checkpoint import load_checkpoint, save_checkpoint
+        position = new_position()
+    head = None     # (length, digest) of the start of the trace data the checkpoint covers
+    if 'resume' in options:
+        try:
+            checkpoint = load_checkpoint(options['resume'])
+        except (OSError, ValueError) as error:
+            print(f"Cannot resume: {error}")
+            return
+        if (checkpoint['replacement_mode'], checkpoint['frames']) != (replacement_mode, frames):
+            print(f"Checkpoint is for {checkpoint['replacement_mode']} with {checkpoint['frames']} frames")
+            return
+        head = checkpoint['head']
+        if head is not None and input_file != '-' and trace_head_digest(input_file, head[0]) != head[1]:
+            print(f"Checkpoint was written for another trace than '{input_file}'")
+            return
+        mmu.set_state(checkpoint['state'])
+        position = checkpoint['position']
+        no_events = checkpoint['events']
+    checkpoint_every = options.get('checkpoint-every', 0) if 'checkpoint' in options else 0
+    last_checkpoint = no_events
+
     debug_mode  = sys.argv[4]
 
-    # Set debug mode
-    if debug_mode == "debug":
-        mmu.set_debug()
-    elif debug_mode == "quiet":
-        mmu.reset_debug()
-    else:
+    # Set debug mode; structured events are traced in debug mode or when an events file is given
+    if debug_mode not in ("debug", "quiet"):
         print("Invalid debug mode. Valid options are [debug, quiet]")
         return
+    sink = None
+    if debug_mode == "debug" or 'events' in options:
+        sink = create_sink(options)
+        mmu.set_debug(sink)
+    else:
+        mmu.reset_debug()
+    if 'profile' in options and scope is None:
+        profiler.attach(mmu)
+    # The I/O timing model and windowed metrics wrap the MMU, in that order
+    simulator = mmu
+    io_model = None
+    if any(name in options for name in IO_OPTIONS):
+        io_model = IoModel(mmu, options.get('read-latency', 100.0), options.get('write-latency', 200.0),
+                           queue_depth=options.get('queue', 1), flush_batch=options.get('flush', 0),
+                           buffer_pages=options.get('buffer', 0), clean_batch=options.get('clean', 0),
+                           clean_interval=options.get('clean-interval', 1000.0))
+        simulator = io_model
+    metrics = None
+    if 'metrics' in options:
+        metrics = WindowMetrics(simulator, options.get('window', 10000))
+        simulator = metrics
+    if profiler is not None:
+        # Everything up to the main loop, including reading the whole trace for opt
+        profiler.phases['load'] = time.perf_counter() - profiler.start
 
     ############################################################
     # Main Loop: Process the addresses from the trace file     #
     ############################################################
 
-    no_events = 0
-
-
-    with open(input_file, 'r') as trace_file:
-        for trace_line in trace_file:
-            trace_cmd = trace_line.strip().split(" ")
-            logical_address = int(trace_cmd[0], 16)
-            page_number = logical_address >>  PAGE_OFFSET
-
-
-            # Process read or write
-            if trace_cmd[1] == "R":
-                mmu.read_memory(page_number)
-            elif trace_cmd[1] == "W":
-                mmu.write_memory(page_number)
-            else:
-                print(f"Badly formatted file. Error on line {no_events + 1}")
-                return
+    # Chunks of (page numbers, write flags) streamed from a text, compressed or binary trace,
+    # or of (PIDs, page numbers, write flags) from a PID-tagged trace
+    # References the position covers; a chunk that does not move it is an unterminated last line
+    covered = position['references'] if position is not None else 0
+    deferred = False
+    try:
+        if scope is not None:
+            trace_chunks = iter_pid_trace_chunks(input_file, PAGE_OFFSET)
+        elif trace_chunks is None:
+            trace_chunks = iter_trace_chunks(input_file, PAGE_OFFSET, progress, position)
+        if profiler is None:
+            for chunk in trace_chunks:
+                if position is not None and position['references'] == covered:
+                    # An unterminated last line: simulated, but the final checkpoint ends before it
+                    deferred = True
+                    if 'checkpoint' in options:
+                        save_checkpoint(options['checkpoint'], mmu, replacement_mode, frames, no_events, position,
+                                        input_file, head)
+                        print(f"Unterminated last line of '{input_file}' left out of the checkpoint", file=sys.stderr)
+                # Process the reads and writes of the chunk
+                simulator.process_batch(*chunk)
+                no_events += len(chunk[-1])
+                covered = position['references'] if position is not None else 0
+                if checkpoint_every and not deferred and no_events - last_checkpoint >= checkpoint_every:
+                    head = save_checkpoint(options['checkpoint'], mmu, replacement_mode, frames, no_events,
+                                           position, input_file, head)
+                    last_checkpoint = no_events
+        else:
+            trace_chunks = iter(trace_chunks)
+            while True:
+                with profiler.phase('parse'):
+                    chunk = next(trace_chunks, None)
+                if chunk is None:
+                    break
+                if position is not None and position['references'] == covered:
+                    # An unterminated last line: simulated, but the final checkpoint ends before it
+                    deferred = True
+                    if 'checkpoint' in options:
+                        save_checkpoint(options['checkpoint'], mmu, replacement_mode, frames, no_events, position,
+                                        input_file, head)
+                        print(f"Unterminated last line of '{input_file}' left out of the checkpoint", file=sys.stderr)
+                with profiler.phase('simulate'):
+                    simulator.process_batch(*chunk)
+                no_events += len(chunk[-1])
+                covered = position['references'] if position is not None else 0
+                profiler.update(no_events)
+                if checkpoint_every and not deferred and no_events - last_checkpoint >= checkpoint_every:
+                    head = save_checkpoint(options['checkpoint'], mmu, replacement_mode, frames, no_events,
+                                           position, input_file, head)
+                    last_checkpoint = no_events
+    except (TraceFormatError, ValueError) as error:
+        print(error)
+        return
+    finally:
+        if sink is not None:
+            sink.close()
+            if 'ring' in options:
+                # The ring buffer, possibly behind a SampledSink
+                getattr(sink, 'sink', sink).dump(options['events'])
 
-            no_events += 1
+    if metrics is not None:
+        metrics.finish()
+        metrics.write(options['metrics'])
+    if io_model is not None:
+        io_model.finish()
+    if 'checkpoint' in options and not deferred:
+        save_checkpoint(options['checkpoint'], mmu, replacement_mode, frames, no_events, position, input_file, head)
 
     # TODO: Print results
+    if profiler is not None:
+        report_start = time.perf_counter()
     print(f"total memory frames: {frames}")
     print(f"events in trace: {no_events}")
     print(f"total disk reads: {mmu.get_total_disk_reads()}")
     print(f"total disk writes: {mmu.get_total_disk_writes()}")
     print("page fault rate: ", end="")
     print("{0:.4f}".format(mmu.get_total_page_faults() / no_events))
+    if io_model is not None:
+        timing = io_model.report()
+        print(f"soft faults: {timing['soft_faults']}")
+        if io_model.clean_batch:
+            print(f"pre-cleaned pages: {timing['precleaned']}")
+        print(f"device reads: {timing['device_reads']}")
+        print(f"device writes: {timing['device_writes']}")
+        print(f"stall time: {timing['stall_time'] / 1000:.3f} ms")
+        print(f"simulated time: {timing['simulated_time'] / 1000:.3f} ms")
+        print(f"effective throughput: {timing['throughput']:.0f} references/s")
+    if scope is not None:
+        for pid, (references, disk_reads, disk_writes, page_faults) in mmu.get_process_stats().items():
+            print(f"process {pid}: events {references}, disk reads {disk_reads}, "
+                  f"disk writes {disk_writes}, page fault rate {page_faults / references:.4f}")
+    if profiler is not None:
+        profiler.phases['report'] += time.perf_counter() - report_start
+        if 'profile' in options:
+            profiler.write(options['profile'], mmu, no_events)
 
 if __name__ == "__main__":
     main()
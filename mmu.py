@@ -7,7 +7,61 @@
 * for the MMU.
 *
 '''
+def collapse_runs(pages, writes):
+    # Collapse each run of consecutive references to the same page into a single
+    # reference, which is a write if any reference in the run was. Every reference
+    # after the first in a run is a hit on the most recently used page, so this does
+    # not change the outcome for recency-based policies. Returns two lists.
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None and len(pages) > 1:
+        pages = np.asarray(pages)
+        writes = np.asarray(writes, dtype=bool)
+        starts = np.flatnonzero(np.concatenate(([True], pages[1:] != pages[:-1])))
+        return pages[starts].tolist(), np.logical_or.reduceat(writes, starts).tolist()
+
+    collapsed_pages = []
+    collapsed_writes = []
+    previous = None
+    for page_number, is_write in zip(pages, writes):
+        if collapsed_pages and page_number == previous:
+            collapsed_writes[-1] = collapsed_writes[-1] or bool(is_write)
+        else:
+            collapsed_pages.append(page_number)
+            collapsed_writes.append(bool(is_write))
+            previous = page_number
+    return collapsed_pages, collapsed_writes
+
+
 class MMU:
+    # Policies whose state depends on how often a page is hit, not only on recency,
+    # must set this to False so process_batch() replays every reference.
+    collapse_repeats = True
+    # Set on the traced variant of a class (see eventtrace.py) to the class it traces.
+    traced_base = None
+
+    def process_batch(self, pages, writes):
+    # Process a chunk of references given as page numbers and write flags (lists or
+    # NumPy arrays). Repeated references are collapsed first unless debugging.
+
+        if self.collapse_repeats and not self.debug:
+            pages, writes = collapse_runs(pages, writes)
+        else:
+            if hasattr(pages, 'tolist'):
+                pages = pages.tolist()
+            if hasattr(writes, 'tolist'):
+                writes = writes.tolist()
+        read_memory = self.read_memory
+        write_memory = self.write_memory
+        for page_number, is_write in zip(pages, writes):
+            if is_write:
+                write_memory(page_number)
+            else:
+                read_memory(page_number)
+
     def read_memory(self, page_number):
         pass
 
@@ -17,11 +71,45 @@ class MMU:
     def replace_page(self, page_number, mode):
         pass
 
-    def set_debug(self):
-        pass
+    def is_resident(self, page_number):
+        return page_number in self.memory
+
+    def dirty_pages(self):
+    # Iterate over the resident dirty pages, those nearest replacement first where the
+    # policy can tell. With set_dirty this lets the I/O model write pages back early.
+
+        raise NotImplementedError(f"{type(self).__name__} does not expose its dirty bits")
+
+    def set_dirty(self, page_number, dirty):
+    # Set the dirty bit of a resident page, e.g. clear it once the page is written back.
+
+        raise NotImplementedError(f"{type(self).__name__} does not expose its dirty bits")
+
+    def set_debug(self, sink=None):
+    # Switch this instance to the traced variant of its class, which reports every
+    # reference as structured events to sink (printed messages by default). The
+    # untraced classes contain no debug checks at all.
+
+        from eventtrace import PrintSink, traced_class
+        self.sink = sink if sink is not None else PrintSink()
+        self.trace_seq = 0
+        self.__class__ = traced_class(type(self))
+        self.debug = True
 
     def reset_debug(self):
-        pass
+        if self.traced_base is not None:
+            self.__class__ = self.traced_base
+        self.debug = False
+
+    def get_state(self):
+    # Return the simulation state (page table, replacement order, reference and
+    # dirty bits, RNG, counters) as a picklable dict, without any tracing state.
+
+        return {name: value for name, value in self.__dict__.items()
+                if name not in ('sink', 'trace_seq', 'debug')}
+
+    def set_state(self, state):
+        self.__dict__.update(state)
 
     def get_total_disk_reads(self):
         return -1
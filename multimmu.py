@@ -0,0 +1,320 @@
+'''
+* Multi-process MMU: several address spaces sharing one pool of frames.
+* Every process has its own page table and counters, found by PID in a dict.
+* The replacement scope decides whose page is replaced on a page fault:
+*   global        one replacement order over the resident pages of every process
+*   fixed         a process holding its quota replaces one of its own pages. The
+*                 quota is given per PID, or else an equal share of the frames no
+*                 quota reserves
+*   proportional  as fixed, with quotas proportional to the number of distinct
+*                 pages each process has referenced
+* In the local scopes a process under its quota takes a free frame, or else a
+* frame of the process furthest over its quota, as quotas shift when processes
+* arrive and grow. The replacement policy within a scope is lru or clock.
+*
+* Usage: python multimmu.py interleave outputfile quantum inputfile [inputfile...]
+* writes a PID-tagged trace taking `quantum` references from each input in turn.
+*
+'''
+from collections import OrderedDict
+import sys
+
+from mmu import MMU
+from tracefile import iter_trace_chunks
+
+POLICIES = ('lru', 'clock')
+SCOPES = ('global', 'fixed', 'proportional')
+
+
+class LruSet:
+    # Resident pages in LRU order, each mapped to its dirty bit
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def touch(self, key, is_write):
+        """Records a reference and returns True if the key is resident."""
+        entries = self.entries
+        if key not in entries:
+            return False
+        entries.move_to_end(key)
+        if is_write:
+            entries[key] = True
+        return True
+
+    def insert(self, key, is_write):
+        self.entries[key] = is_write
+
+    def evict(self):
+        """Removes the replacement victim and returns (key, dirty)."""
+        return self.entries.popitem(last=False)
+
+
+class ClockSet:
+    # Resident pages on a clock ring. Slots freed when a page is taken away are reused
+    # first, so with a fixed number of pages this is the same as ClockMMU.
+    def __init__(self):
+        self.slots = {}                 # Key -> slot holding it
+        self.keys = []                  # Slot -> key, None for a free slot
+        self.ref_bits = bytearray()
+        self.dirty = bytearray()
+        self.free = []                  # Free slots, the most recently freed last
+        self.pointer = 0                # Clock hand
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def touch(self, key, is_write):
+        slot = self.slots.get(key)
+        if slot is None:
+            return False
+        self.ref_bits[slot] = 1
+        if is_write:
+            self.dirty[slot] = 1
+        return True
+
+    def insert(self, key, is_write):
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = key
+        else:
+            slot = len(self.keys)
+            self.keys.append(key)
+            self.ref_bits.append(0)
+            self.dirty.append(0)
+        self.slots[key] = slot
+        self.ref_bits[slot] = 1
+        self.dirty[slot] = is_write
+
+    def evict(self):
+        keys = self.keys
+        ref_bits = self.ref_bits
+        slot = self.pointer
+        while True:
+            if slot >= len(keys):
+                slot = 0
+            if keys[slot] is not None:
+                if not ref_bits[slot]:
+                    break
+                ref_bits[slot] = 0
+            slot += 1
+        key = keys[slot]
+        keys[slot] = None
+        del self.slots[key]
+        self.free.append(slot)
+        self.pointer = slot + 1
+        return key, bool(self.dirty[slot])
+
+
+REPLACEMENT_SETS = {'lru': LruSet, 'clock': ClockSet}
+
+
+class Process:
+    def __init__(self, pid, pages):
+        self.pid = pid
+        self.pages = pages              # Page table: resident pages in local scopes
+        self.resident = 0               # Resident pages in the global scope
+        self.seen = set()               # Distinct pages referenced, for proportional quotas
+        self.references = 0
+        self.page_faults = 0
+        self.disk_reads = 0
+        self.disk_writes = 0
+
+
+class MultiProcessMMU(MMU):
+    def __init__(self, frames, policy='lru', scope='global', quotas=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Policy must be one of {POLICIES}")
+        if scope not in SCOPES:
+            raise ValueError(f"Scope must be one of {SCOPES}")
+        if quotas and scope == 'global':
+            raise ValueError("Quotas only apply to the local scopes")
+        if quotas and min(quotas.values()) < 1:
+            raise ValueError("Quotas must be at least one frame")
+        if quotas and sum(quotas.values()) > frames:
+            raise ValueError(f"Quotas of {sum(quotas.values())} frames exceed the {frames} frames")
+        self.frames = frames
+        self.policy = policy
+        self.scope = scope
+        self.quotas = quotas or {}      # PID -> fixed number of frames
+        self.unreserved = frames - sum(self.quotas.values())    # Frames shared by the other processes
+        self.processes = {}             # PID -> Process
+        self.used = 0                   # Occupied frames
+        self.pages_seen = 0             # Distinct (PID, page) pairs referenced
+        # In the global scope one replacement order holds (PID, page) keys
+        self.replacement = REPLACEMENT_SETS[policy]() if scope == 'global' else None
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
+        self.debug = False
+
+    def _process(self, pid):
+        process = self.processes.get(pid)
+        if process is None:
+            pages = None if self.replacement is not None else REPLACEMENT_SETS[self.policy]()
+            process = self.processes[pid] = Process(pid, pages)
+        return process
+
+    def quota(self, process):
+        """Returns the number of frames a process may hold in a local scope."""
+        if process.pid in self.quotas:
+            return self.quotas[process.pid]
+        # Processes without a quota share the frames no quota reserves
+        if self.scope == 'proportional':
+            pages_seen = self.pages_seen - sum(len(self.processes[pid].seen)
+                                               for pid in self.quotas if pid in self.processes)
+            return max(1, self.unreserved * len(process.seen) // pages_seen)
+        sharing = len(self.processes) - sum(pid in self.processes for pid in self.quotas)
+        return max(1, self.unreserved // sharing)
+
+    def _write_back(self, process, page_number, dirty):
+        if dirty:
+            process.disk_writes += 1
+            self.disk_writes += 1
+        self.last_victim = page_number
+
+    def _evict_local(self, process):
+        page_number, dirty = process.pages.evict()
+        self._write_back(process, page_number, dirty)
+
+    def _make_room(self, process):
+        # Find a frame for a page of a process in a local scope
+        if len(process.pages) >= self.quota(process):
+            self._evict_local(process)
+        elif self.used < self.frames:
+            self.used += 1
+        else:
+            victim = max((other for other in self.processes.values() if len(other.pages)),
+                         key=lambda other: len(other.pages) - self.quota(other))
+            self._evict_local(victim)
+
+    def access(self, pid, page_number, is_write):
+        process = self.processes.get(pid) or self._process(pid)
+        process.references += 1
+        if self.replacement is not None:
+            key = (pid, page_number)
+            if self.replacement.touch(key, is_write):
+                return
+            if self.used < self.frames:
+                self.used += 1
+            else:
+                (victim_pid, victim_page), dirty = self.replacement.evict()
+                victim = self.processes[victim_pid]
+                victim.resident -= 1
+                self._write_back(victim, victim_page, dirty)
+            self.replacement.insert(key, is_write)
+            process.resident += 1
+        else:
+            if process.pages.touch(page_number, is_write):
+                return
+            if self.scope == 'proportional' and page_number not in process.seen:
+                process.seen.add(page_number)
+                self.pages_seen += 1
+            self._make_room(process)
+            process.pages.insert(page_number, is_write)
+        process.page_faults += 1
+        process.disk_reads += 1
+        self.page_faults += 1
+        self.disk_reads += 1
+
+    def _traced_access(self, pid, page_number, is_write):
+        # Emit the events of one reference to the sink, as eventtrace.py does
+        seq = self.trace_seq
+        self.trace_seq = seq + 1
+        faults = self.page_faults
+        disk_writes = self.disk_writes
+        self.last_victim = None
+        self.access(pid, page_number, is_write)
+        if self.page_faults == faults:
+            self.sink.emit(seq, 'hit', page_number, int(is_write))
+            return
+        if self.last_victim is not None:
+            if self.disk_writes > disk_writes:
+                self.sink.emit(seq, 'writeback', self.last_victim, page_number)
+            self.sink.emit(seq, 'eviction', self.last_victim, page_number)
+        self.sink.emit(seq, 'fault', page_number, int(is_write))
+
+    def process_batch(self, pids, pages, writes):
+    # Process a chunk of references of several processes, given as PIDs, page
+    # numbers and write flags
+
+        if hasattr(pids, 'tolist'):
+            pids = pids.tolist()
+        if hasattr(pages, 'tolist'):
+            pages = pages.tolist()
+        if hasattr(writes, 'tolist'):
+            writes = writes.tolist()
+        access = self._traced_access if self.debug else self.access
+        for pid, page_number, is_write in zip(pids, pages, writes):
+            access(pid, page_number, is_write)
+
+    def read_memory(self, page_number):
+        self.access(0, page_number, False)
+
+    def write_memory(self, page_number):
+        self.access(0, page_number, True)
+
+    def is_resident(self, page_number, pid=0):
+        if self.replacement is not None:
+            return (pid, page_number) in self.replacement
+        process = self.processes.get(pid)
+        return process is not None and page_number in process.pages
+
+    def get_process_stats(self):
+        """Returns {pid: (references, disk_reads, disk_writes, page_faults)}."""
+        return {pid: (process.references, process.disk_reads, process.disk_writes, process.page_faults)
+                for pid, process in sorted(self.processes.items())}
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
+
+
+def interleave_traces(output_file, input_files, quantum, page_offset=12):
+    """Writes a PID-tagged trace that runs the inputs round robin, `quantum` references
+    at a time, with the i-th input as PID i. Returns the number of references."""
+    readers = [(pid, _references(input_file, page_offset)) for pid, input_file in enumerate(input_files)]
+    count = 0
+    with open(output_file, 'w') as out:
+        while readers:
+            running = []
+            for pid, references in readers:
+                taken = 0
+                for page_number, is_write in references:
+                    out.write(f"{pid} {page_number << page_offset:08x} {'W' if is_write else 'R'}\n")
+                    taken += 1
+                    if taken == quantum:
+                        running.append((pid, references))
+                        break
+                count += taken
+            readers = running
+    return count
+
+
+def _references(input_file, page_offset):
+    for pages, writes in iter_trace_chunks(input_file, page_offset):
+        if hasattr(pages, 'tolist'):
+            pages, writes = pages.tolist(), writes.tolist()
+        yield from zip(pages, writes)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 5 or sys.argv[1] != 'interleave':
+        print("Usage: python multimmu.py interleave outputfile quantum inputfile [inputfile...]")
+    else:
+        written = interleave_traces(sys.argv[2], sys.argv[4:], int(sys.argv[3]))
+        print(f"Wrote {written} references to '{sys.argv[2]}'")
@@ -0,0 +1,82 @@
+from mmu import MMU
+import heapq
+
+class OptMMU(MMU):
+    # Belady's optimal replacement: evict the page whose next use is furthest away.
+    # It needs the whole reference string up front; the next use of every reference
+    # is precomputed once, and resident pages sit in a max-heap keyed by next use,
+    # so each eviction costs O(log n).
+    collapse_repeats = False    # References are matched to the precomputed string by position
+
+    def __init__(self, frames, pages):
+        self.frames = frames            # Number of frames in memory
+        self.memory = {}                # Page -> [next use, dirty]
+        self.heap = []                  # (-next use, page); stale entries are skipped lazily
+        self.time = 0                   # Position of the next reference in the string
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
+        self.debug = False
+
+        # next_use[i] is the position of the next reference to pages[i], or len(pages) if none
+        if hasattr(pages, 'tolist'):
+            pages = pages.tolist()
+        self.next_use = [0] * len(pages)
+        seen = {}
+        for position in range(len(pages) - 1, -1, -1):
+            self.next_use[position] = seen.get(pages[position], len(pages))
+            seen[pages[position]] = position
+
+    def _access(self, page_number, is_write):
+        next_use = self.next_use[self.time]
+        self.time += 1
+        entry = self.memory.get(page_number)
+        if entry is not None:
+            entry[0] = next_use
+            entry[1] = entry[1] or is_write
+        else:
+            self.page_faults += 1
+            if len(self.memory) >= self.frames:
+                self._evict()
+            entry = self.memory[page_number] = [next_use, is_write]
+            self.disk_reads += 1
+        heapq.heappush(self.heap, (-next_use, page_number))
+        if len(self.heap) > 4 * self.frames + 64:       # Drop stale entries so the heap stays O(frames)
+            self.heap = [(-entry[0], page) for page, entry in self.memory.items()]
+            heapq.heapify(self.heap)
+
+    def _evict(self):
+        while True:
+            next_use, victim = heapq.heappop(self.heap)
+            entry = self.memory.get(victim)
+            if entry is not None and entry[0] == -next_use:
+                break
+        if entry[1]:                                    # Write back if the victim page is dirty
+            self.disk_writes += 1
+        del self.memory[victim]
+        self.last_victim = victim
+
+    def read_memory(self, page_number):
+        self._access(page_number, False)
+
+    def write_memory(self, page_number):
+        self._access(page_number, True)
+
+    def dirty_pages(self):
+    # Resident dirty pages, the one used again furthest in the future first.
+
+        dirty_pages = [page_number for page_number, entry in self.memory.items() if entry[1]]
+        return iter(sorted(dirty_pages, key=lambda page_number: -self.memory[page_number][0]))
+
+    def set_dirty(self, page_number, dirty):
+        self.memory[page_number][1] = dirty
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
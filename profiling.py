@@ -0,0 +1,147 @@
+'''
+* Opt-in instrumentation of a simulation run.
+* A Profiler times the phases of memsim (load, parse, simulate, report), prints a
+* periodic progress line with an ETA to stderr and writes a machine-readable JSON
+* report. To split simulation time into hits and replacements, the MMU is moved to
+* a profiled subclass that times every reference, in the same way as tracing does;
+* unprofiled runs keep the untouched classes and pay nothing.
+*
+'''
+from contextlib import contextmanager
+import json
+import sys
+import time
+
+PHASES = ('load', 'parse', 'simulate', 'report')
+
+
+_profiled_classes = {}
+
+
+def profiled_class(cls):
+    """Returns the profiled variant of an MMU class, creating it on first use.
+
+    The instance needs the attributes profile_hit_time, profile_fault_time,
+    profile_hits and profile_faults, which the accesses accumulate into.
+    """
+    if cls not in _profiled_classes:
+        base_read = cls.read_memory
+        base_write = cls.write_memory
+        clock = time.perf_counter
+
+        def profiled_access(self, page_number, access):
+            faults = self.page_faults
+            start = clock()
+            access(self, page_number)
+            elapsed = clock() - start
+            if self.page_faults != faults:
+                self.profile_fault_time += elapsed
+                self.profile_faults += 1
+            else:
+                self.profile_hit_time += elapsed
+                self.profile_hits += 1
+
+        def read_memory(self, page_number):
+            profiled_access(self, page_number, base_read)
+
+        def write_memory(self, page_number):
+            profiled_access(self, page_number, base_write)
+
+        _profiled_classes[cls] = type('Profiled' + cls.__name__, (cls,), {
+            'profiled_base': cls,
+            'read_memory': read_memory,
+            'write_memory': write_memory,
+        })
+    return _profiled_classes[cls]
+
+
+def peak_rss():
+    # Peak resident set size of this process in bytes, or None where unsupported
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024      # Linux reports KiB
+
+
+class Profiler:
+    def __init__(self, progress_interval=None, stream=sys.stderr):
+        self.progress_interval = progress_interval  # Seconds between progress lines, None for none
+        self.stream = stream
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.start = time.perf_counter()
+        self.last_progress = self.start
+        self.events = 0
+        self.total_events = None    # Events in the trace, when it has been read up front
+        self.fraction = None        # Fraction of the input consumed, None when unknown
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the time spent in the with block to a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += time.perf_counter() - start
+
+    def attach(self, mmu):
+        """Moves an MMU to its profiled class to split hit and replacement time."""
+        mmu.profile_hit_time = mmu.profile_fault_time = 0.0
+        mmu.profile_hits = mmu.profile_faults = 0
+        mmu.__class__ = profiled_class(type(mmu))
+
+    def progress(self, fraction):
+        # Called by the trace reader after each chunk
+        self.fraction = fraction
+
+    def update(self, events):
+        """Records the events simulated so far and prints a progress line when one is due."""
+        self.events = events
+        if self.total_events:
+            self.fraction = events / self.total_events
+        if self.progress_interval is None:
+            return
+        now = time.perf_counter()
+        if now - self.last_progress < self.progress_interval:
+            return
+        self.last_progress = now
+        elapsed = now - self.start
+        rate = events / elapsed if elapsed else 0.0
+        line = f"{events} events, {rate:.0f} events/s"
+        if self.fraction:
+            line += f", {100 * self.fraction:.1f}%, ETA {elapsed * (1 - self.fraction) / self.fraction:.0f}s"
+        print(line, file=self.stream, flush=True)
+
+    def report(self, mmu, events):
+        """Returns the profile of a finished run as a JSON-serialisable dict."""
+        simulate = self.phases['simulate']
+        faults = mmu.get_total_page_faults()
+        base = getattr(mmu, 'traced_base', None) or getattr(mmu, 'profiled_base', None) or type(mmu)
+        report = {
+            'mmu': base.__name__,
+            'frames': getattr(mmu, 'frames', None),
+            'events': events,
+            'phases': dict(self.phases),
+            'total_seconds': time.perf_counter() - self.start,
+            'events_per_second': events / simulate if simulate else None,
+            'page_faults': faults,
+            'disk_writes': mmu.get_total_disk_writes(),
+            'peak_rss_bytes': peak_rss(),
+        }
+        if hasattr(mmu, 'profile_hits'):
+            dispatched = mmu.profile_hits + mmu.profile_faults
+            report.update({
+                'hit_seconds': mmu.profile_hit_time,
+                'replacement_seconds': mmu.profile_fault_time,
+                'references_simulated': dispatched,
+                'references_collapsed': events - dispatched,
+            })
+        if hasattr(mmu, 'hand_steps'):
+            report['hand_steps_per_fault'] = mmu.hand_steps / faults if faults else 0.0
+        return report
+
+    def write(self, path, mmu, events):
+        with open(path, 'w') as out:
+            json.dump(self.report(mmu, events), out, indent=2)
+            out.write('\n')
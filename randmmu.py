@@ -2,70 +2,63 @@ from mmu import MMU
 import random
 
 class RandMMU(MMU):
-    def __init__(self, frames):
-        self.frames = frames    # Number of frames in memory
-        self.memory = {}        # Memory dictionary to store pages
-        self.page_table = []    # Page table to keep track of pages in memory
+    def __init__(self, frames, seed=None):
+        self.frames = frames                # Number of frames in memory
+        self.memory = {}                    # Page -> slot index of the frame holding it
+        self.page_table = []                # Slot array: page held by each occupied frame
+        self.dirty = bytearray(frames)      # Dirty bit of each frame
+        self.rng = random.Random(seed)      # Per-instance RNG so runs are reproducible and independent
         self.disk_reads = 0
         self.disk_writes = 0
         self.page_faults = 0
-        self.debug = False
-
-    def set_debug(self):
-        self.debug = True
-
-    def reset_debug(self):
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
         self.debug = False
 
     def read_memory(self, page_number):
     # If the page is in memory, do nothing.
     # If not, handle the page fault by randomly replacing an existing page.
 
-        if page_number in self.memory:
-            if self.debug:
-                print(f"Page {page_number} read from memory.")
-        else:
+        if page_number not in self.memory:
             self.page_faults += 1
-            if len(self.page_table) < self.frames:          # Memory has space, so load the page into the next available slot.
-                self.page_table.append(page_number)
-            else:
-                victim = random.choice(self.page_table)     # Memory is full, so randomly replace a page in memory.
-                self.page_table.remove(victim)
-                if self.memory[victim] == 'W':              # Write back if the victim page is dirty
-                    self.disk_writes += 1
-                self.page_table.append(page_number)
-                if self.debug:
-                    print(f"Page {victim} replaced by page {page_number}.")
-                del self.memory[victim]                     # Remove the old page from memory
-            self.memory[page_number] = 'R'                  # Load the new page with read status
-            self.disk_reads += 1
-            if self.debug:
-                print(f"Page {page_number} loaded into memory.")
+            self.replace_page(page_number, 'R')
 
     def write_memory(self, page_number):
     # If the page is in memory, mark it as dirty.
     # If not, handle the page fault by randomly replacing an existing page.
 
-        if page_number in self.memory:
-            self.memory[page_number] = 'W'      # Mark page as written (dirty)
-            if self.debug:
-                print(f"Page {page_number} written to memory.")
+        slot = self.memory.get(page_number)
+        if slot is not None:
+            self.dirty[slot] = 1                # Mark page as written (dirty)
         else:
             self.page_faults += 1
-            if len(self.page_table) < self.frames:      # Memory has space, so load the page into the next available slot.
-                self.page_table.append(page_number)
-            else:
-                victim = random.choice(self.page_table) # Memory is full, so randomly replace a page in memory.
-                self.page_table.remove(victim)
-                if self.memory[victim] == 'W':          # Write back if the victim page is dirty
-                    self.disk_writes += 1
-                if self.debug:
-                    print(f"Page {victim} replaced by page {page_number}.")
-                del self.memory[victim]                 # Remove the old page from memory
-            self.memory[page_number] = 'W'              # Load the new page with write status
-            self.disk_reads += 1
-            if self.debug:
-                print(f"Page {page_number} loaded into memory.")
+            self.replace_page(page_number, 'W')
+
+    def replace_page(self, page_number, mode):
+    # If there's an empty frame, load the new page into the next free slot.
+    # If memory is full, overwrite the slot of a randomly chosen victim in place (O(1)).
+
+        if len(self.page_table) < self.frames:          # Memory has space, so load the page into the next available slot.
+            slot = len(self.page_table)
+            self.page_table.append(page_number)
+        else:
+            slot = self.rng.randrange(self.frames)      # Memory is full, so randomly replace a page in memory.
+            victim = self.page_table[slot]
+            if self.dirty[slot]:                        # Write back if the victim page is dirty
+                self.disk_writes += 1
+            del self.memory[victim]                     # Remove the old page from memory
+            self.page_table[slot] = page_number
+            self.last_victim = victim
+        self.memory[page_number] = slot
+        self.dirty[slot] = mode == 'W'                  # Load the new page with its read/write status
+        self.disk_reads += 1
+
+    def dirty_pages(self):
+    # Resident dirty pages, in slot order, as any of them is as likely to be replaced.
+
+        return (page_number for slot, page_number in enumerate(self.page_table) if self.dirty[slot])
+
+    def set_dirty(self, page_number, dirty):
+        self.dirty[self.memory[page_number]] = dirty
 
     def get_total_disk_reads(self):
         return self.disk_reads
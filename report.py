@@ -0,0 +1,121 @@
+'''
+* Reporting stage of the experiments: plots and summaries of averaged results.
+* Results are {trace: {algorithm: {frames: (disk_reads, disk_writes, page_fault_rate)}}}.
+* Plots are rendered with matplotlib's object-oriented API on one figure per
+* trace, and each metric is drawn once for both its linear and its log-scale
+* plot. matplotlib is only imported when something is plotted, so summaries
+* (CSV or JSON) can be written by headless sweeps without the plotting stack.
+* A Reporter renders traces in parallel worker processes as their results come
+* in, while simulations of other traces are still running.
+*
+* Usage: python report.py summaryfile [plotsdir]   renders the plots of a saved summary
+*
+'''
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import json
+import os
+import sys
+
+# Metric name, axis label and index in a result tuple
+METRICS = (('disk_reads', 'Disk Reads', 0),
+           ('disk_writes', 'Disk Writes', 1),
+           ('page_fault_rate', 'Page Fault Rate', 2))
+COLUMNS = ('trace', 'algorithm', 'frames', 'disk_reads', 'disk_writes', 'page_fault_rate')
+
+
+def render_trace(trace, results, plots_dir='plots', dpi=300):
+    """Writes the linear and log-scale plot of every metric of a trace."""
+    from matplotlib.figure import Figure
+
+    print(f'Plotting results for {trace}...')
+    figure = Figure(figsize=(10, 6))
+    axes = figure.add_subplot()
+    for name, label, index in METRICS:
+        axes.clear()
+        for algorithm, data in results.items():
+            frame_sizes = sorted(data)
+            axes.plot(frame_sizes, [data[frames][index] for frames in frame_sizes], marker='o', label=algorithm)
+        axes.set_xlabel('Number of Frames')
+        axes.set_ylabel(label)
+        axes.set_title(f'{label} vs Number of Frames for {trace}')
+        axes.legend()
+        axes.grid(True, which="both", ls="--", linewidth=0.5)
+        figure.savefig(os.path.join(plots_dir, f'{trace}_{name}.png'), dpi=dpi)
+
+        axes.set_yscale('log')      # Use log scale for better visualization
+        axes.set_ylabel(f'{label} (Log Scale)')
+        figure.savefig(os.path.join(plots_dir, f'{trace}_{name}_precise.png'), dpi=dpi)
+    return trace
+
+
+class Reporter:
+    # Renders traces as they are submitted, over `workers` processes (1 renders
+    # in the calling process). With plots disabled nothing is rendered at all.
+    def __init__(self, plots=True, plots_dir='plots', workers=None, dpi=300):
+        self.plots = plots
+        self.plots_dir = plots_dir
+        self.dpi = dpi
+        self.pool = ProcessPoolExecutor(workers) if plots and workers != 1 else None
+        self.pending = []
+        self.results = {}
+
+    def submit(self, trace, results):
+        self.results[trace] = results
+        if not self.plots:
+            return
+        if self.pool is None:
+            render_trace(trace, results, self.plots_dir, self.dpi)
+        else:
+            self.pending.append(self.pool.submit(render_trace, trace, results, self.plots_dir, self.dpi))
+
+    def close(self):
+        """Waits for every plot to be written, raising the first rendering error."""
+        if self.pool is not None:
+            for future in self.pending:
+                future.result()
+            self.pool.shutdown()
+
+
+def summary_rows(all_results):
+    for trace, trace_results in all_results.items():
+        for algorithm, data in trace_results.items():
+            for frames in sorted(data):
+                yield (trace, algorithm, frames) + tuple(data[frames])
+
+
+def write_summary(all_results, path):
+    """Writes the results as CSV, or as JSON if path ends in .json."""
+    rows = list(summary_rows(all_results))
+    if path.endswith('.json'):
+        with open(path, 'w') as out:
+            json.dump([dict(zip(COLUMNS, row)) for row in rows], out, indent=2)
+        return
+    with open(path, 'w', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+
+
+def load_summary(path):
+    """Reads a summary written by write_summary back into results."""
+    with open(path, newline='') as summary_file:
+        rows = json.load(summary_file) if path.endswith('.json') else list(csv.DictReader(summary_file))
+    all_results = {}
+    for row in rows:
+        data = all_results.setdefault(row['trace'], {}).setdefault(row['algorithm'], {})
+        data[int(row['frames'])] = (float(row['disk_reads']), float(row['disk_writes']),
+                                    float(row['page_fault_rate']))
+    return all_results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python report.py summaryfile [plotsdir]")
+    else:
+        plots_dir = sys.argv[2] if len(sys.argv) > 2 else 'plots'
+        os.makedirs(plots_dir, exist_ok=True)
+        reporter = Reporter(plots_dir=plots_dir)
+        for trace, trace_results in load_summary(sys.argv[1]).items():
+            reporter.submit(trace, trace_results)
+        reporter.close()
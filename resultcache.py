@@ -0,0 +1,170 @@
+'''
+* Persistent on-disk cache of simulation results.
+* Entries are keyed by the trace contents (SHA-256 digest), the algorithm, the number
+* of frames, PAGE_OFFSET, the RNG seed and the simulator version, so only new or
+* changed points need to be simulated. Unseeded randomised runs are not cached.
+* Old entries are evicted by age and by total cache size.
+*
+* Usage: python resultcache.py [stats|evict|clear] [cachedir]
+*
+'''
+from sweep import SimResult
+from memsim import SIMULATOR_VERSION
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+DEFAULT_CACHE_DIR = '.simcache'
+DEFAULT_MAX_BYTES = 64 << 20            # 64 MB
+DEFAULT_MAX_AGE = 90 * 24 * 3600        # 90 days
+DIGEST_INDEX = 'digests.json'
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE):
+        self.directory = directory
+        self.max_bytes = max_bytes      # Total size of entries kept by evict()
+        self.max_age = max_age          # Seconds since an entry was last used
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(directory, 'entries'), exist_ok=True)
+
+    def trace_digest(self, trace):
+        """Returns the SHA-256 digest of a trace file.
+
+        Digests are remembered by path, size and modification time, so an unchanged
+        trace is only hashed once.
+        """
+        index_path = os.path.join(self.directory, DIGEST_INDEX)
+        try:
+            with open(index_path) as index_file:
+                index = json.load(index_file)
+        except (FileNotFoundError, ValueError):
+            index = {}
+
+        path = os.path.abspath(trace)
+        stat = os.stat(path)
+        known = index.get(path)
+        if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime_ns:
+            return known['digest']
+
+        sha = hashlib.sha256()
+        with open(path, 'rb') as trace_file:
+            for block in iter(lambda: trace_file.read(1 << 20), b''):
+                sha.update(block)
+        index[path] = {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'digest': sha.hexdigest()}
+        with open(index_path, 'w') as index_file:
+            json.dump(index, index_file)
+        return index[path]['digest']
+
+    def _entry_path(self, digest, algorithm, frames, page_offset, seed):
+        if algorithm != 'rand':
+            seed = None         # Only randomised policies depend on the seed
+        key = json.dumps([digest, algorithm, frames, page_offset, seed, SIMULATOR_VERSION])
+        name = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.directory, 'entries', name[:2], name + '.json')
+
+    def get(self, trace, digest, algorithm, frames, page_offset=12, seed=None):
+        """Returns the cached SimResult for a configuration, or None."""
+        path = self._entry_path(digest, algorithm, frames, page_offset, seed)
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)          # Mark as recently used for eviction
+        self.hits += 1
+        return SimResult(trace, algorithm, frames, seed, entry['disk_reads'],
+                         entry['disk_writes'], entry['page_faults'], entry['events'])
+
+    def put(self, digest, result, page_offset=12):
+        """Stores a SimResult. Unseeded randomised results are not reproducible and are skipped."""
+        if result.algorithm == 'rand' and result.seed is None:
+            return
+        path = self._entry_path(digest, result.algorithm, result.frames, page_offset, result.seed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'disk_reads': result.disk_reads, 'disk_writes': result.disk_writes,
+                 'page_faults': result.page_faults, 'events': result.events}
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as entry_file:
+            json.dump(entry, entry_file)
+        os.replace(temporary, path)     # Atomic, so concurrent readers never see half an entry
+
+    def _entries(self):
+        entries = []
+        for root, dirs, files in os.walk(os.path.join(self.directory, 'entries')):
+            for name in files:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        """Removes entries unused for max_age seconds, then the least recently used
+        entries until the cache is under max_bytes. Returns the number removed."""
+        entries = sorted(self._entries())
+        removed = 0
+        cutoff = time.time() - self.max_age
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Invalidates the whole cache."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(os.path.join(self.directory, 'entries'), exist_ok=True)
+
+    def stats(self):
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(size for mtime, size, path in entries),
+                'hits': self.hits, 'misses': self.misses}
+
+
+def split_cached(cache, jobs, page_offset=12):
+    """Splits {trace: configs} into (cached SimResults, {trace: configs still to run})."""
+    cached = []
+    missing = {}
+    for trace, configs in jobs.items():
+        digest = cache.trace_digest(trace)
+        for algorithm, frames, seed in configs:
+            result = cache.get(trace, digest, algorithm, frames, page_offset, seed)
+            if result is None:
+                missing.setdefault(trace, []).append((algorithm, frames, seed))
+            else:
+                cached.append(result)
+    return cached, missing
+
+
+def store_results(cache, results, page_offset=12):
+    """Stores SimResults, hashing each trace once. Yields the results back unchanged."""
+    digests = {}
+    for result in results:
+        if result.trace not in digests:
+            digests[result.trace] = cache.trace_digest(result.trace)
+        cache.put(digests[result.trace], result, page_offset)
+        yield result
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    cache = ResultCache(sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CACHE_DIR)
+    if command == 'clear':
+        cache.clear()
+        print(f"Cleared '{cache.directory}'")
+    elif command == 'evict':
+        print(f"Evicted {cache.evict()} entries")
+    elif command == 'stats':
+        stats = cache.stats()
+        print(f"{stats['entries']} entries, {stats['bytes']} bytes")
+    else:
+        print("Usage: python resultcache.py [stats|evict|clear] [cachedir]")
@@ -1,8 +1,13 @@
-import subprocess
-import matplotlib.pyplot as plt
+import argparse
+import itertools
 import shutil
 import os
 
+from report import Reporter, load_summary, write_summary
+from resultcache import ResultCache, split_cached, store_results
+from sweep import run_grid, average
+from windowmetrics import load_metrics
+
 # Define the parameters for the experiments
 algorithms = ['rand', 'lru', 'clock']
 experiments = {
@@ -11,7 +16,7 @@ experiments = {
     'gcc.trace': [256, 320, 384, 448, 512, 640, 768, 896, 1024, 1152, 1280, 1408, 1536, 1664, 1792, 1920, 2048, 2176, 2304, 2432, 2560, 2688, 2816, 2944, 3072],
     'sixpack.trace': [256, 320, 384, 448, 512, 640, 768, 896, 1024, 1152, 1280, 1408, 1536, 1664, 1792, 1920, 2048, 2176, 2304, 2432, 2560, 2688, 2816, 2944, 3072, 3200, 3328, 3456, 3584],
 }
-mode = 'quiet'
+rand_runs = 10
 
 # Delete directories if they exist and create them again
 def create_clean_directory(path):
@@ -19,35 +24,44 @@ def create_clean_directory(path):
         shutil.rmtree(path)
     os.makedirs(path)
 
-create_clean_directory('results')
-create_clean_directory('plots')
-
-def run_simulations(trace, frames, algorithm, runs=1):
-    """Runs the simulator and returns the results as a tuple (disk_reads, disk_writes, page_fault_rate)."""
-    print(f'Running simulations for {trace} with {frames} frames using {algorithm} algorithm...')
-    total_reads = 0
-    total_writes = 0
-    total_fault_rate = 0.0
-    cmd = ['python3', 'memsim.py', trace, str(frames), algorithm, mode]
-
-    for i in range(runs):
-        # Run the simulator
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        # Parsing the output
-        output_lines = result.stdout.splitlines()
-        disk_reads = int(output_lines[2].split(': ')[1])
-        disk_writes = int(output_lines[3].split(': ')[1])
-        page_fault_rate = float(output_lines[4].split(': ')[1])
-        # Accumulate the results
-        total_reads += disk_reads
-        total_writes += disk_writes
-        total_fault_rate += page_fault_rate
-    # Calculate the average results
-    avg_reads = total_reads / runs
-    avg_writes = total_writes / runs
-    avg_fault_rate = total_fault_rate / runs
-    
-    return avg_reads, avg_writes, avg_fault_rate
+def iter_simulations(experiments, algorithms, workers=None, cache=None):
+    """Runs every trace, algorithm and frame size over one pool of worker processes.
+
+    Points found in the result cache are not simulated again. Yields
+    (trace, {algorithm: {frames: (disk_reads, disk_writes, page_fault_rate)}})
+    as soon as every run of a trace has finished, with rand results averaged
+    over rand_runs seeded runs, while the other traces are still simulated.
+    """
+    jobs = {}
+    for trace, frame_sizes in experiments.items():
+        print(f'Scheduling simulations for {trace} with {len(frame_sizes)} frame sizes using {", ".join(algorithms)}...')
+        jobs[trace] = [(algorithm, frames, seed)
+                       for algorithm in algorithms
+                       for frames in dict.fromkeys(frame_sizes)     # Each point once, in order
+                       for seed in range(rand_runs if algorithm == 'rand' else 1)]
+    remaining = {trace: len(trace_jobs) for trace, trace_jobs in jobs.items()}
+
+    if cache is not None:
+        cached, jobs = split_cached(cache, jobs)
+        print(f'{len(cached)} results found in the cache, {sum(map(len, jobs.values()))} left to simulate...')
+        results = itertools.chain(cached, store_results(cache, run_grid(jobs, workers)))
+    else:
+        results = run_grid(jobs, workers)
+
+    runs_by_point = {}
+    for result in results:
+        runs_by_point.setdefault((result.trace, result.algorithm, result.frames), []).append(result)
+        remaining[result.trace] -= 1
+        if not remaining[result.trace]:
+            frame_sizes = dict.fromkeys(experiments[result.trace])
+            yield result.trace, {algorithm: {frames: average(runs_by_point.pop((result.trace, algorithm, frames)))
+                                             for frames in frame_sizes}
+                                 for algorithm in algorithms}
+
+def run_simulations(experiments, algorithms, workers=None, cache=None):
+    """Runs every experiment and returns {trace: results} once all of them have finished."""
+    all_results = dict(iter_simulations(experiments, algorithms, workers, cache))
+    return {trace: all_results[trace] for trace in experiments}
 
 def save_results(trace, algorithm, frames, results):
     """Saves the results to a text file."""
@@ -57,112 +71,110 @@ def save_results(trace, algorithm, frames, results):
     with open(filename, 'a') as f:
         f.write(f'Frames: {frames}, Disk Reads: {results[0]}, Disk Writes: {results[1]}, Page Fault Rate: {results[2]}\n')
 
-def plot_results(results, trace):
-    """Plots the results for a specific trace."""
-    print(f'Plotting results for {trace}...')
-
-    # Plot Disk Reads vs Number of Frames
-    plt.figure(figsize=(10, 6))
-    for algorithm, data in results.items():
-        frame_sizes = list(data.keys())
-        disk_reads = [data[frames][0] for frames in frame_sizes]
-        plt.plot(frame_sizes, disk_reads, marker='o', label=algorithm)
-    plt.xlabel('Number of Frames')
-    plt.ylabel('Disk Reads')
-    plt.title(f'Disk Reads vs Number of Frames for {trace}')
-    plt.legend()
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-    plt.savefig(f'plots/{trace}_disk_reads.png', dpi=300)
-    plt.close()
-
-    # Plot Disk Writes vs Number of Frames
-    plt.figure(figsize=(10, 6))
-    for algorithm, data in results.items():
-        frame_sizes = list(data.keys())
-        disk_writes = [data[frames][1] for frames in frame_sizes]
-        plt.plot(frame_sizes, disk_writes, marker='o', label=algorithm)
-    plt.xlabel('Number of Frames')
-    plt.ylabel('Disk Writes')
-    plt.title(f'Disk Writes vs Number of Frames for {trace}')
-    plt.legend()
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-    plt.savefig(f'plots/{trace}_disk_writes.png', dpi=300)
-    plt.close()
-
-    # Plot Page Fault Rate vs Number of Frames
-    plt.figure(figsize=(10, 6))
-    for algorithm, data in results.items():
-        frame_sizes = list(data.keys())
-        page_fault_rates = [data[frames][2] for frames in frame_sizes]
-        plt.plot(frame_sizes, page_fault_rates, marker='o', label=algorithm)
-    plt.xlabel('Number of Frames')
-    plt.ylabel('Page Fault Rate')
-    plt.title(f'Page Fault Rate vs Number of Frames for {trace}')
-    plt.legend()
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-    plt.savefig(f'plots/{trace}_page_fault_rate.png', dpi=300)
-    plt.close()
-
-def plot_results_precise(results, trace):
-    """Plots the results for a specific trace with enhanced precision for comparison."""
-    print(f'Plotting results for {trace} with enhanced precision...')
+def plot_metrics(metrics_file):
+    """Plots the windowed metrics written by memsim.py --metrics, without replaying the trace."""
+    import matplotlib.pyplot as plt
 
-    # Plot Disk Reads vs Number of Frames with log scale
-    plt.figure(figsize=(10, 6))
-    for algorithm, data in results.items():
-        frame_sizes = sorted(data.keys())
-        disk_reads = [data[frames][0] for frames in frame_sizes]
-        plt.plot(frame_sizes, disk_reads, marker='o', label=algorithm)
-    plt.yscale('log') # Use log scale for better visualization
-    plt.xlabel('Number of Frames')
-    plt.ylabel('Disk Reads (Log Scale)')
-    plt.title(f'Disk Reads vs Number of Frames for {trace}')
-    plt.legend()
-    plt.grid(True, which="both", ls="--", linewidth=0.5)
-    plt.savefig(f'plots/{trace}_disk_reads_precise.png', dpi=300)
-    plt.close()
+    print(f'Plotting windowed metrics from {metrics_file}...')
+    metrics = load_metrics(metrics_file)
+    name = os.path.basename(metrics_file)
+    starts = metrics['start']
 
-    # Plot Disk Writes vs Number of Frames with log scale
+    # Plot Page Fault and Write-back Rates over the trace
     plt.figure(figsize=(10, 6))
-    for algorithm, data in results.items():
-        frame_sizes = sorted(data.keys())
-        disk_writes = [data[frames][1] for frames in frame_sizes]
-        plt.plot(frame_sizes, disk_writes, marker='o', label=algorithm)
-    plt.yscale('log') # Use log scale for better visualization
-    plt.xlabel('Number of Frames')
-    plt.ylabel('Disk Writes (Log Scale)')
-    plt.title(f'Disk Writes vs Number of Frames for {trace}')
+    plt.plot(starts, [faults / references for faults, references in zip(metrics['faults'], metrics['references'])],
+             label='page fault rate')
+    plt.plot(starts, [writebacks / references for writebacks, references in zip(metrics['writebacks'], metrics['references'])],
+             label='write-back rate')
+    plt.xlabel('Reference')
+    plt.ylabel('Rate per Reference')
+    plt.title(f'Page Fault Rate per {metrics["window"]} References for {name}')
     plt.legend()
     plt.grid(True, which="both", ls="--", linewidth=0.5)
-    plt.savefig(f'plots/{trace}_disk_writes_precise.png', dpi=300)
+    plt.savefig(f'plots/{name}_fault_rate_over_time.png', dpi=300)
     plt.close()
 
-    # Plot Page Fault Rate vs Number of Frames with log scale
+    # Plot Working Set Size over the trace
     plt.figure(figsize=(10, 6))
-    for algorithm, data in results.items():
-        frame_sizes = sorted(data.keys())
-        page_fault_rates = [data[frames][2] for frames in frame_sizes]
-        plt.plot(frame_sizes, page_fault_rates, marker='o', label=algorithm)
-    plt.yscale('log') # Use log scale for better visualization
-    plt.xlabel('Number of Frames')
-    plt.ylabel('Page Fault Rate (Log Scale)')
-    plt.title(f'Page Fault Rate vs Number of Frames for {trace}')
-    plt.legend()
+    plt.plot(starts, metrics['working_set'])
+    plt.xlabel('Reference')
+    plt.ylabel('Distinct Pages')
+    plt.title(f'Working Set W(t, {metrics["window"]}) for {name}')
     plt.grid(True, which="both", ls="--", linewidth=0.5)
-    plt.savefig(f'plots/{trace}_page_fault_rate_precise.png', dpi=300)
+    plt.savefig(f'plots/{name}_working_set.png', dpi=300)
     plt.close()
 
-
-# Run experiments and collect results
-for trace, frame_sizes in experiments.items():
-    trace_results = {algo: {} for algo in algorithms}
-    for algo in algorithms:
-        for frames in frame_sizes:
-            runs = 10 if algo == 'rand' else 1
-            results = run_simulations(trace, frames, algo, runs)
-            trace_results[algo][frames] = results
-            save_results(trace, algo, frames, results)
-    plot_results(trace_results, trace)
-    plot_results_precise(trace_results, trace)
-
-print("Experiments completed, results and plots saved.")
+    # Plot Reuse Distance Histogram over the trace, one row per power of two
+    if metrics['reuse']:
+        plt.figure(figsize=(10, 6))
+        plt.imshow(metrics['reuse'], aspect='auto', origin='lower', interpolation='nearest',
+                   extent=(starts[0], starts[-1] + metrics['references'][-1], -0.5, len(metrics['reuse']) - 0.5))
+        plt.colorbar(label='References')
+        plt.xlabel('Reference')
+        plt.ylabel('Reuse Distance (log2)')
+        plt.title(f'Reuse Distances per {metrics["window"]} References for {name}')
+        plt.savefig(f'plots/{name}_reuse_distance.png', dpi=300)
+        plt.close()
+
+
+# Run experiments and collect results (guarded so worker processes can import this module)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the replacement policy experiments.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--cache-dir', default='.simcache',
+                        help='directory of the result cache (default: .simcache)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='simulate every point without reading or writing the cache')
+    parser.add_argument('--clear-cache', action='store_true',
+                        help='invalidate the result cache before running')
+    parser.add_argument('--plot-metrics', nargs='+', metavar='FILE',
+                        help='only plot windowed metrics files written by memsim.py --metrics')
+    parser.add_argument('--no-plots', action='store_true',
+                        help='do not plot, so matplotlib is never imported')
+    parser.add_argument('--summary', metavar='FILE',
+                        help='also write the averaged results to FILE, as JSON if it ends in .json, else CSV')
+    parser.add_argument('--report-only', metavar='SUMMARY',
+                        help='only plot the results of a summary file, without simulating')
+    parser.add_argument('--plot-workers', type=int, default=None,
+                        help='processes rendering plots (default: one per CPU, 1 renders in this process)')
+    parser.add_argument('--dpi', type=int, default=300, help='resolution of the plots (default: 300)')
+    args = parser.parse_args()
+
+    if args.plot_metrics:
+        os.makedirs('plots', exist_ok=True)
+        for metrics_file in args.plot_metrics:
+            plot_metrics(metrics_file)
+        raise SystemExit
+
+    reporter = Reporter(not args.no_plots, 'plots', args.plot_workers, args.dpi)
+    if args.report_only:
+        os.makedirs('plots', exist_ok=True)
+        for trace, trace_results in load_summary(args.report_only).items():
+            reporter.submit(trace, trace_results)
+        reporter.close()
+        raise SystemExit
+
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_dir)
+        if args.clear_cache:
+            cache.clear()
+
+    create_clean_directory('results')
+    if reporter.plots:
+        create_clean_directory('plots')
+
+    # Each trace is saved and handed to the plotting processes as soon as it is complete
+    for trace, trace_results in iter_simulations(experiments, algorithms, args.workers, cache):
+        for algo in algorithms:
+            for frames in experiments[trace]:
+                save_results(trace, algo, frames, trace_results[algo][frames])
+        reporter.submit(trace, trace_results)
+    if cache is not None:
+        cache.evict()
+    reporter.close()
+    if args.summary:
+        write_summary({trace: reporter.results[trace] for trace in experiments}, args.summary)
+
+    print("Experiments completed, results and plots saved.")
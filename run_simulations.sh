@@ -3,6 +3,9 @@
 # Define the base results directory
 BASE_RESULTS_DIR="results"
 
+# Number of simulations to run at once (default: one per CPU)
+JOBS="${JOBS:-$(nproc 2>/dev/null || echo 1)}"
+
 # Remove the existing results directory to start fresh
 if [ -d "$BASE_RESULTS_DIR" ]; then
     echo "Deleting existing results directory..."
@@ -25,19 +28,26 @@ run_simulations() {
     for frame in "${frames[@]}"; do
         local output_file="${output_dir}/${frame}.txt"
 
-        if [[ "$algorithm" == "rand" ]]; then
-            # Run the simulation at least 5 times for the "rand" algorithm
-            for i in {1..5}; do
-                echo "Run #$i: python3 memsim.py $trace $frame $algorithm quiet" | tee -a "$output_file"
+        # Wait for a free job slot; each frame size writes its own output file
+        while (( $(jobs -rp | wc -l) >= JOBS )); do
+            wait -n
+        done
+
+        (
+            if [[ "$algorithm" == "rand" ]]; then
+                # Run the simulation at least 5 times for the "rand" algorithm
+                for i in {1..5}; do
+                    echo "Run #$i: python3 memsim.py $trace $frame $algorithm quiet" | tee -a "$output_file"
+                    python3 memsim.py "$trace" "$frame" "$algorithm" quiet >> "$output_file"
+                    echo "" >> "$output_file"
+                done
+            else
+                # Run once for other algorithms
+                echo "Running: python3 memsim.py $trace $frame $algorithm quiet" | tee -a "$output_file"
                 python3 memsim.py "$trace" "$frame" "$algorithm" quiet >> "$output_file"
                 echo "" >> "$output_file"
-            done
-        else
-            # Run once for other algorithms
-            echo "Running: python3 memsim.py $trace $frame $algorithm quiet" | tee -a "$output_file"
-            python3 memsim.py "$trace" "$frame" "$algorithm" quiet >> "$output_file"
-            echo "" >> "$output_file"
-        fi
+            fi
+        ) &
     done
 }
 
@@ -45,11 +55,15 @@ run_simulations() {
 traces=("swim.trace" "bzip.trace" "gcc.trace" "sixpack.trace")
 algorithms=("rand" "lru" "clock")
 
+# Start the longest jobs first: largest traces, and rand (repeated runs) before the others
+mapfile -t traces < <(ls -S "${traces[@]}" 2>/dev/null)
+
 # Run simulations for each combination of trace and algorithm
 for trace in "${traces[@]}"; do
     for algorithm in "${algorithms[@]}"; do
         run_simulations "$trace" "$algorithm"
     done
 done
+wait
 
 echo "All simulations completed. Results are organized in the '$BASE_RESULTS_DIR' folder."
@@ -0,0 +1,238 @@
+'''
+* Approximate fault curves from spatially sampled traces (SHARDS).
+* A page is sampled when a hash of its number falls below a threshold T out of
+* MODULUS, so every reference to a sampled page is kept and the sample behaves like
+* a trace of R = T / MODULUS of the pages. Simulating the sample with frames * R
+* frames estimates the page fault rate of the full trace with the full number of
+* frames. Rates are normalised by the R * N references expected in the sample
+* rather than those actually sampled (the SHARDS adjustment), since a sample
+* missing a hot page would otherwise overstate the fault rate.
+*
+* The rate is either fixed, or derived from a sample budget: the `budget` smallest
+* distinct hash values are kept, which sets T so that about `budget` distinct pages
+* are sampled, using O(budget) memory for the hash values.
+* Several replicas with independently salted hashes are simulated; their spread
+* is reported as the error bound (two standard deviations of the mean rate). Every
+* replica is sampled in the same single pass over the trace; with a budget each one
+* drops references as soon as they hash above the lowest T that is still possible.
+*
+* Usage: python sampling.py estimate inputfile replacementmode frames[,frames...] [options]
+*        python sampling.py validate inputfile [inputfile...] [options]
+*
+'''
+from collections import namedtuple
+import argparse
+import json
+import statistics
+
+from sweep import run_sweep, simulate
+from tracefile import iter_trace_chunks
+
+MODULUS = 1 << 24
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15    # Fibonacci hashing
+MASK = (1 << 64) - 1
+
+Estimate = namedtuple('Estimate', ['algorithm', 'frames', 'rate', 'sampled_frames', 'sampled_references',
+                                   'disk_reads', 'disk_writes', 'page_fault_rate', 'fault_rate_error'])
+
+
+def _salt(replica):
+    return (replica * 0x2545F4914F6CDD1D + 0x632BE59BD9B4E019) & MASK
+
+
+def page_hash(pages, salt=0):
+    """Hashes page numbers to [0, MODULUS), as a NumPy array for an array, else a list."""
+    if hasattr(pages, 'dtype'):
+        import numpy as np
+        with np.errstate(over='ignore'):
+            hashed = (pages.astype(np.uint64) ^ np.uint64(salt)) * np.uint64(HASH_MULTIPLIER)
+        return (hashed >> np.uint64(64 - 24)).astype(np.int64)
+    return [(((page ^ salt) * HASH_MULTIPLIER) & MASK) >> (64 - 24) for page in pages]
+
+
+class _Replica:
+    # Sample of one replica, drawn while the trace is streamed. With a budget the
+    # threshold starts at MODULUS and falls to one above the budget-th smallest distinct
+    # hash seen so far, so references above it can never be sampled and are dropped
+    def __init__(self, salt, threshold, budget=None):
+        self.salt = salt
+        self.threshold = threshold
+        self.budget = budget
+        self.smallest = set()       # Distinct hash values below the threshold
+        self.pages = []
+        self.writes = []
+        self.hashes = []
+
+    def _narrow(self, hashed):
+        smallest = self.smallest
+        smallest.update(hashed)
+        if len(smallest) > 2 * self.budget:
+            # One more than the budget is kept, to tell a full sample from an overflowing one
+            kept = sorted(smallest)[:self.budget + 1]
+            self.smallest = set(kept)
+            self.threshold = kept[self.budget - 1] + 1
+
+    def add(self, pages, writes):
+        hashed = page_hash(pages, self.salt)
+        threshold = self.threshold
+        if hasattr(hashed, 'dtype'):
+            keep = hashed < threshold
+            hashed = hashed[keep]
+            self.pages.append(pages[keep])
+            self.writes.append(writes[keep])
+            self.hashes.append(hashed)
+            if self.budget is not None:
+                self._narrow(hashed.tolist())
+        else:
+            kept = [(page_number, is_write, value) for page_number, is_write, value in zip(pages, writes, hashed)
+                    if value < threshold]
+            self.pages.extend(page_number for page_number, is_write, value in kept)
+            self.writes.extend(is_write for page_number, is_write, value in kept)
+            self.hashes.extend(value for page_number, is_write, value in kept)
+            if self.budget is not None:
+                self._narrow(value for page_number, is_write, value in kept)
+
+    def finish(self):
+        """Returns (threshold, pages, writes) of the final sample."""
+        if self.budget is not None:
+            if len(self.smallest) <= self.budget:
+                self.threshold = MODULUS    # The whole trace fits in the budget
+            else:
+                self.threshold = sorted(self.smallest)[self.budget - 1] + 1
+        threshold = self.threshold
+        if self.pages and hasattr(self.pages[0], 'dtype'):
+            import numpy as np
+            keep = np.concatenate(self.hashes) < threshold
+            return threshold, np.concatenate(self.pages)[keep], np.concatenate(self.writes)[keep]
+        keep = [value < threshold for value in self.hashes]
+        return (threshold, [page_number for page_number, kept in zip(self.pages, keep) if kept],
+                [is_write for is_write, kept in zip(self.writes, keep) if kept])
+
+
+def load_samples(input_file, replicas, rate=None, budget=None, page_offset=12):
+    """Samples every replica in one pass over the trace, at a fixed rate or within a budget
+    of distinct pages. Returns ([(threshold, pages, writes) per replica], total references)."""
+    threshold = MODULUS if budget is not None else max(1, round(rate * MODULUS))
+    samples = [_Replica(_salt(replica), threshold, budget) for replica in range(replicas)]
+    total = 0
+    for pages, writes in iter_trace_chunks(input_file, page_offset):
+        total += len(pages)
+        for sample in samples:
+            sample.add(pages, writes)
+    return [sample.finish() for sample in samples], total
+
+
+def estimate_curve(input_file, algorithm, frame_counts, rate=None, budget=None, replicas=3,
+                   page_offset=12, seed=0):
+    """Estimates (disk_reads, disk_writes, page_fault_rate) of every frame count from samples.
+
+    Give either a sampling rate or a budget of distinct sampled pages. Returns a list
+    of Estimates, one per frame count.
+    """
+    samples, total = load_samples(input_file, replicas, rate, budget, page_offset)
+
+    runs = {frames: [] for frames in frame_counts}
+    for replica, (threshold, pages, writes) in enumerate(samples):
+        sampled_rate = threshold / MODULUS
+        for frames in frame_counts:
+            sampled_frames = max(1, round(frames * sampled_rate))
+            if not len(pages):
+                runs[frames].append((sampled_rate, sampled_frames, 0, 0.0, 0.0, total))
+                continue
+            result = simulate(input_file, pages, writes, algorithm, sampled_frames, seed + replica)
+            # SHARDS adjustment: sampled pages of a skewed trace carry more or fewer than
+            # R of the references, and the difference is counted as hits
+            expected = sampled_rate * total
+            runs[frames].append((sampled_rate, sampled_frames, len(pages), result.page_faults / expected,
+                                 result.disk_writes / expected, total))
+
+    estimates = []
+    for frames in frame_counts:
+        fault_rates = [run[3] for run in runs[frames]]
+        write_rates = [run[4] for run in runs[frames]]
+        total = runs[frames][0][5]
+        fault_rate = statistics.mean(fault_rates)
+        error = 2 * statistics.stdev(fault_rates) / len(fault_rates) ** 0.5 if len(fault_rates) > 1 else None
+        estimates.append(Estimate(algorithm, frames, statistics.mean(run[0] for run in runs[frames]),
+                                  round(statistics.mean(run[1] for run in runs[frames])),
+                                  sum(run[2] for run in runs[frames]) // len(runs[frames]),
+                                  fault_rate * total, statistics.mean(write_rates) * total,
+                                  fault_rate, error))
+    return estimates
+
+
+def validate(input_file, algorithms, frame_counts, rate=None, budget=None, replicas=3, page_offset=12,
+             workers=None):
+    """Compares estimates with exact runs. Returns a list of
+    (estimate, exact page fault rate) pairs."""
+    exact = run_sweep(input_file, [(algorithm, frames, 0) for algorithm in algorithms for frames in frame_counts],
+                      workers, page_offset)
+    exact_rates = {(result.algorithm, result.frames): result.page_fault_rate for result in exact}
+    comparisons = []
+    for algorithm in algorithms:
+        for estimate in estimate_curve(input_file, algorithm, frame_counts, rate, budget, replicas, page_offset):
+            comparisons.append((estimate, exact_rates[(algorithm, estimate.frames)]))
+    return comparisons
+
+
+def _print_estimate(estimate, exact=None):
+    error = f' +/- {estimate.fault_rate_error:.4f}' if estimate.fault_rate_error is not None else ''
+    line = (f'{estimate.algorithm:<6} {estimate.frames:>6} frames ({estimate.sampled_frames} sampled): '
+            f'fault rate {estimate.page_fault_rate:.4f}{error}, '
+            f'disk reads {estimate.disk_reads:.0f}, disk writes {estimate.disk_writes:.0f}')
+    if exact is not None:
+        line += f', exact {exact:.4f}, error {abs(estimate.page_fault_rate - exact):.4f}'
+    print(line)
+
+
+def _frame_list(value):
+    return [int(frames) for frames in value.split(',')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Estimate fault curves from spatially sampled traces.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    estimate_parser = commands.add_parser('estimate', help='estimate the curve of one algorithm')
+    estimate_parser.add_argument('inputfile')
+    estimate_parser.add_argument('replacementmode')
+    estimate_parser.add_argument('frames', type=_frame_list)
+    validate_parser = commands.add_parser('validate', help='compare estimates with exact runs')
+    validate_parser.add_argument('inputfiles', nargs='+')
+    validate_parser.add_argument('--algorithms', default='lru,clock,rand')
+    validate_parser.add_argument('--frames', type=_frame_list, default=[64, 256, 1024])
+    validate_parser.add_argument('--workers', type=int, default=None)
+    for command in (estimate_parser, validate_parser):
+        size = command.add_mutually_exclusive_group()
+        size.add_argument('--rate', type=float, default=None, help='fraction of pages sampled (default 0.01)')
+        size.add_argument('--budget', type=int, default=None, help='number of distinct pages sampled')
+        command.add_argument('--replicas', type=int, default=3, help='independently hashed samples')
+        command.add_argument('--pageoffset', type=int, default=12)
+        command.add_argument('--json', metavar='FILE', help='also write the estimates as JSON')
+    args = parser.parse_args()
+    rate = args.rate if args.rate is not None or args.budget is not None else 0.01
+
+    if args.command == 'estimate':
+        estimates = estimate_curve(args.inputfile, args.replacementmode, args.frames, rate, args.budget,
+                                   args.replicas, args.pageoffset)
+        for estimate in estimates:
+            _print_estimate(estimate)
+        output = [estimate._asdict() for estimate in estimates]
+    else:
+        output = []
+        for input_file in args.inputfiles:
+            print(f'Validating {input_file}...')
+            comparisons = validate(input_file, args.algorithms.split(','), args.frames, rate, args.budget,
+                                   args.replicas, args.pageoffset, args.workers)
+            within = 0
+            for estimate, exact in comparisons:
+                _print_estimate(estimate, exact)
+                error = estimate.fault_rate_error
+                within += error is not None and abs(estimate.page_fault_rate - exact) <= error
+                output.append(dict(estimate._asdict(), trace=input_file, exact_page_fault_rate=exact))
+            mean_error = statistics.mean(abs(estimate.page_fault_rate - exact) for estimate, exact in comparisons)
+            print(f'{input_file}: mean absolute error {mean_error:.4f}, '
+                  f'{within} of {len(comparisons)} exact rates within the error bound')
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(output, out, indent=2)
@@ -0,0 +1,86 @@
+'''
+* Regression checks of results the simulator promises to be exactly the same.
+*   resume    a run of the start of a trace, checkpointed and resumed on the whole
+*             trace (as if the rest had been appended since, cutting the first part
+*             off on and between line ends), prints the same as one run of the trace.
+*             A start that is the whole trace without its final newline must also
+*             print the same with --checkpoint as without
+*   lrucurve  lru_curve gives the same results as LruMMU for every frame count
+* Both are checked on every bundled trace unless traces are given.
+*
+* Usage: python selfcheck.py [trace...]   exits with status 1 if any check fails
+*
+'''
+import os
+import subprocess
+import sys
+import tempfile
+
+from lrustack import lru_curve
+from sweep import load_trace, simulate
+
+BUNDLED_TRACES = ('trace1', 'trace2', 'trace3', 'sample.trace')
+RESUME_MODES = ('lru', 'clock', 'esc', 'arc', '2q', 'lfu')
+RESUME_FRAMES = 4
+MEMSIM = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'memsim.py')
+
+
+def _memsim(*args):
+    return subprocess.run([sys.executable, MEMSIM, *args], capture_output=True, text=True, check=True).stdout
+
+
+def _cuts(data):
+    # Split points of a trace: at a line end and inside a line, a third and two thirds in,
+    # and before the final newline, leaving a complete but unterminated last line
+    cuts = [len(data.rstrip(b'\n'))]
+    for third in (len(data) // 3, 2 * len(data) // 3):
+        line_end = data.rfind(b'\n', 0, third) + 1
+        cuts.extend(cut for cut in (line_end, line_end + 3) if 0 < cut < len(data))
+    return sorted(set(cuts))
+
+
+def check_resume(trace):
+    """Returns the (mode, cut) pairs of which the resumed run differs from one run."""
+    with open(trace, 'rb') as trace_file:
+        data = trace_file.read()
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, os.path.basename(trace))
+        checkpoint = os.path.join(directory, 'checkpoint')
+        for mode in RESUME_MODES:
+            expected = _memsim(trace, str(RESUME_FRAMES), mode, 'quiet')
+            for cut in _cuts(data):
+                with open(path, 'wb') as out:
+                    out.write(data[:cut])
+                start = _memsim(path, str(RESUME_FRAMES), mode, 'quiet', '--checkpoint', checkpoint)
+                if cut == len(data.rstrip(b'\n')) and start != _memsim(path, str(RESUME_FRAMES), mode, 'quiet'):
+                    failures.append((mode, cut))
+                with open(path, 'wb') as out:
+                    out.write(data)
+                if _memsim(path, str(RESUME_FRAMES), mode, 'quiet', '--resume', checkpoint) != expected:
+                    failures.append((mode, cut))
+    return failures
+
+
+def check_lru_curve(trace):
+    """Returns the frame counts at which lru_curve differs from LruMMU."""
+    pages, writes = load_trace(trace)
+    frame_counts = list(range(1, len(set(pages)) + 2))
+    curve = lru_curve(trace, frame_counts)
+    failures = []
+    for frames in frame_counts:
+        result = simulate(trace, pages, writes, 'lru', frames)
+        if curve[frames] != (result.disk_reads, result.disk_writes, result.page_fault_rate):
+            failures.append(frames)
+    return failures
+
+
+if __name__ == "__main__":
+    traces = sys.argv[1:] or [os.path.join(os.path.dirname(MEMSIM), trace) for trace in BUNDLED_TRACES]
+    failed = False
+    for trace in traces:
+        for name, check in (('resume', check_resume), ('lrucurve', check_lru_curve)):
+            failures = check(trace)
+            print(f"{name} {trace}: {'FAIL ' + str(failures) if failures else 'ok'}")
+            failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,216 @@
+'''
+* In-process batch runner for parameter sweeps.
+* A trace is parsed once into compact arrays and every (algorithm, frames, seed)
+* configuration is replayed against it, optionally fanned out over a pool of
+* worker processes that each receive the parsed trace once at start-up.
+* run_grid() schedules configurations of several traces over one pool, longest
+* jobs first. Before starting the pool it converts every text trace to the binary
+* format in a temporary directory, reading each one once, and the workers
+* memory-map it, so all of them share one copy of the page numbers and unpack write
+* flags a chunk at a time.
+*
+'''
+from array import array
+from collections import namedtuple
+from multiprocessing import Pool
+import os
+import tempfile
+
+from lrustack import LruStackMMU
+from memsim import create_mmu
+from tracefile import convert_text_trace, is_binary_trace, iter_trace_chunks, load_binary_trace, unpack_writes
+
+SimResult = namedtuple('SimResult', ['trace', 'algorithm', 'frames', 'seed',
+                                     'disk_reads', 'disk_writes', 'page_faults', 'events'])
+SimResult.page_fault_rate = property(lambda self: self.page_faults / self.events if self.events else 0.0)
+
+
+def load_trace(input_file, page_offset=12):
+    """Parses a trace into (pages, writes) arrays: page numbers and write flags.
+
+    These are NumPy int64/bool arrays when NumPy is installed, else an array and a bytearray.
+    """
+    chunks = list(iter_trace_chunks(input_file, page_offset))
+    try:
+        import numpy as np
+        if not chunks:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+        return (np.concatenate([chunk_pages for chunk_pages, chunk_writes in chunks]),
+                np.concatenate([chunk_writes for chunk_pages, chunk_writes in chunks]))
+    except ImportError:
+        pass
+    pages = array('q')
+    writes = bytearray()
+    for chunk_pages, chunk_writes in chunks:
+        pages.extend(chunk_pages)
+        writes.extend(chunk_writes)
+    return pages, writes
+
+
+class PackedWrites:
+    # Write flags of a memory-mapped binary trace, unpacked only when a slice is taken
+    def __init__(self, write_bits, count):
+        self.write_bits = write_bits
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        start, stop, step = index.indices(self.count)
+        return unpack_writes(self.write_bits, start, stop, True)
+
+
+def load_mapped_trace(input_file, page_offset=12):
+    """Memory-maps a binary trace as (pages, writes) for replay() without copying it.
+
+    Processes mapping the same file share its page numbers through the page cache;
+    writes unpacks the write flags of each slice taken from it. Only a trace stored
+    with another page offset than page_offset is shifted into a private copy.
+    """
+    pages, write_bits, stored_offset = load_binary_trace(input_file)
+    if page_offset < stored_offset:
+        raise ValueError(f"Trace was stored with page offset {stored_offset}, cannot use {page_offset}")
+    if page_offset != stored_offset:
+        shift = page_offset - stored_offset
+        pages = pages >> shift if hasattr(pages, 'dtype') else array('q', (page >> shift for page in pages))
+    return pages, PackedWrites(write_bits, len(pages))
+
+
+def replay(mmu, pages, writes, chunk_size=1 << 16):
+    """Feeds every reference of a parsed trace to an MMU in batches."""
+    for start in range(0, len(pages), chunk_size):
+        mmu.process_batch(pages[start:start + chunk_size], writes[start:start + chunk_size])
+
+
+def simulate(trace, pages, writes, algorithm, frames, seed=None):
+    """Runs a single configuration over a parsed trace and returns a SimResult."""
+    mmu = create_mmu(algorithm, frames, seed, pages)
+    replay(mmu, pages, writes)
+    return SimResult(trace, algorithm, frames, seed, mmu.get_total_disk_reads(),
+                     mmu.get_total_disk_writes(), mmu.get_total_page_faults(), len(pages))
+
+
+def simulate_lru_curve(trace, pages, writes, frame_counts):
+    """Runs every LRU frame count in a single stack-distance pass."""
+    mmu = LruStackMMU()
+    replay(mmu, pages, writes)
+    curve = mmu.get_curve(frame_counts)
+    return [SimResult(trace, 'lru', frames, None, reads, disk_writes, faults, len(pages))
+            for frames, (reads, disk_writes, faults) in curve.items()]
+
+
+# Traces of a worker process, keyed by (trace, page offset). Filled by the pool
+# initializer when the parent has already parsed a trace, else by the first task that
+# needs a trace: mapped from the binary trace the parent made of it, or parsed.
+_worker_traces = {}
+_worker_mapped = {}     # (trace, page offset) -> binary trace to map instead of parsing
+
+
+def _init_worker(preloaded, mapped=None):
+    _worker_traces.clear()
+    _worker_traces.update(preloaded)
+    _worker_mapped.clear()
+    _worker_mapped.update(mapped or {})
+
+
+def _worker_trace(trace, page_offset):
+    key = (trace, page_offset)
+    if key not in _worker_traces:
+        if key in _worker_mapped:
+            _worker_traces[key] = load_mapped_trace(_worker_mapped[key], page_offset)
+        else:
+            _worker_traces[key] = load_trace(trace, page_offset)
+    return _worker_traces[key]
+
+
+def _map_traces(jobs, page_offset, preloaded, directory):
+    # Binary traces the workers map for every trace in jobs, converting text traces
+    # into directory. Traces the caller has parsed and stdin are left out.
+    mapped = {}
+    for index, trace in enumerate(jobs):
+        key = (trace, page_offset)
+        if key in preloaded or trace == '-':
+            continue
+        if is_binary_trace(trace):
+            mapped[key] = trace
+        else:
+            mapped[key] = os.path.join(directory, f'{index}.bin')
+            convert_text_trace(trace, mapped[key], page_offset)
+    return mapped
+
+
+def _run_task(task):
+    trace, page_offset, config = task
+    pages, writes = _worker_trace(trace, page_offset)
+    if config[0] == 'lru-curve':
+        return simulate_lru_curve(trace, pages, writes, config[1])
+    algorithm, frames, seed = config
+    return [simulate(trace, pages, writes, algorithm, frames, seed)]
+
+
+def _plan_tasks(jobs, page_offset):
+    # Turn {trace: configs} into pool tasks, longest first. A task costs about one pass
+    # over its trace, so the trace size is the estimate; the LRU curve of a trace is a
+    # single task for all its frame counts, and its stack-distance pass costs about two.
+    tasks = []
+    for trace, configs in jobs.items():
+        size = os.path.getsize(trace) if trace != '-' and os.path.exists(trace) else 0
+        lru_frames = sorted({config[1] for config in configs if config[0] == 'lru'})
+        if lru_frames:
+            tasks.append((2 * size, (trace, page_offset, ('lru-curve', lru_frames))))
+        tasks.extend((size, (trace, page_offset, tuple(config)))
+                     for config in configs if config[0] != 'lru')
+    tasks.sort(key=lambda task: task[0], reverse=True)
+    return [task for size, task in tasks]
+
+
+def run_grid(jobs, workers=None, page_offset=12, preloaded=None):
+    """Runs {trace: [(algorithm, frames, seed), ...]} over a pool of warm workers.
+
+    Tasks are scheduled longest first. Every text trace is read once, by the calling
+    process, into a binary trace the workers memory-map. SimResults are yielded as
+    tasks complete, in completion order. workers=None uses every CPU and workers=1
+    runs in the calling process. preloaded maps (trace, page_offset) to traces the
+    caller has already parsed, which are copied to each worker.
+    """
+    tasks = _plan_tasks(jobs, page_offset)
+    preloaded = preloaded or {}
+    if workers == 1 or len(tasks) <= 1:
+        _init_worker(preloaded)
+        for task in tasks:
+            yield from _run_task(task)
+        return
+    with tempfile.TemporaryDirectory(prefix='sweep') as directory:
+        mapped = _map_traces(jobs, page_offset, preloaded, directory)
+        with Pool(workers, initializer=_init_worker, initargs=(preloaded, mapped)) as pool:
+            for batch in pool.imap_unordered(_run_task, tasks, chunksize=1):
+                yield from batch
+
+
+def run_sweep(trace, configs, workers=None, page_offset=12):
+    """Runs every (algorithm, frames, seed) configuration over one trace.
+
+    The trace is parsed once and shared by every worker. LRU points are answered
+    together by one stack-distance pass; the other points are distributed over
+    `workers` processes. Results are returned in the order of configs.
+    """
+    configs = [tuple(config) for config in configs]
+    by_config = {}
+    for result in run_grid({trace: configs}, workers, page_offset):
+        by_config[(result.algorithm, result.frames, result.seed)] = result
+    return [by_config[(algorithm, frames, None if algorithm == 'lru' else seed)]
+            for algorithm, frames, seed in configs]
+
+
+def average(results):
+    """Averages repeated runs as (disk_reads, disk_writes, page_fault_rate).
+
+    Runs are summed in seed order, so the result does not depend on the order they
+    finished in.
+    """
+    results = sorted(results, key=lambda result: result.seed if result.seed is not None else -1)
+    runs = len(results)
+    return (sum(result.disk_reads for result in results) / runs,
+            sum(result.disk_writes for result in results) / runs,
+            sum(result.page_fault_rate for result in results) / runs)
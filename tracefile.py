@@ -0,0 +1,472 @@
+'''
+* Trace file formats and trace sources.
+* Text traces hold one reference per line ("0041f7a0 R"). The packed binary format
+* stores the same trace as page numbers (uint32 or uint64, little-endian) followed
+* by a bit array of write flags, behind a header that records PAGE_OFFSET, so it can
+* be memory-mapped and used without any parsing.
+* Text traces may be read from stdin ("-") and may be gzip, xz or zstd compressed;
+* they are streamed in fixed-size chunks so memory use does not grow with the trace.
+*
+* Usage: python tracefile.py inputfile outputfile [pageoffset]
+*
+'''
+from array import array
+import gzip
+import hashlib
+import io
+import lzma
+import mmap
+import os
+import struct
+import sys
+
+BINARY_MAGIC = b'MEMTRACE'
+# magic, page offset, page width in bytes, number of references, offset of the write bits
+BINARY_HEADER = struct.Struct('<8sIIQQ')
+CHUNK_SIZE = 1 << 16
+READ_SIZE = 1 << 20     # Bytes of text read per chunk
+HEAD_SIZE = 1 << 16     # Bytes of trace data a checkpoint identifies its trace by
+
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+class TraceFormatError(ValueError):
+    def __init__(self, line_number):
+        super().__init__(f"Badly formatted file. Error on line {line_number}")
+        self.line_number = line_number
+
+
+class _DecompressedStream(io.BufferedReader):
+    # Decompressed trace that also closes the file it reads from, which GzipFile and
+    # LZMAFile leave open when given a file object
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.source.close()
+
+
+def open_trace(input_file):
+    """Opens a trace for binary reading, transparently decompressing gzip, xz and zstd.
+
+    "-" reads from stdin. Compression is detected from the stream contents, not the
+    file name. Raises FileNotFoundError if the file does not exist.
+    """
+    if input_file == '-':
+        raw = sys.stdin.buffer
+    else:
+        raw = open(input_file, 'rb')
+    if not isinstance(raw, io.BufferedReader):
+        raw = io.BufferedReader(raw)
+    magic = raw.peek(len(XZ_MAGIC))[:len(XZ_MAGIC)]
+
+    if magic.startswith(GZIP_MAGIC):
+        stream = _DecompressedStream(gzip.GzipFile(fileobj=raw))
+    elif magic.startswith(XZ_MAGIC):
+        stream = _DecompressedStream(lzma.LZMAFile(raw))
+    elif magic.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise ValueError("Reading zstd-compressed traces requires the zstandard package")
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    else:
+        stream = raw
+    stream.source = raw         # The file itself, whose position tells how much has been read
+    return stream
+
+
+def is_binary_trace(input_file):
+    """Returns True if the file starts with the packed binary trace header."""
+    if input_file == '-':
+        return False
+    with open(input_file, 'rb') as trace_file:
+        return trace_file.read(len(BINARY_MAGIC)) == BINARY_MAGIC
+
+
+def _parse_line(trace_line, line_number, page_offset):
+    trace_cmd = trace_line.split()
+    if len(trace_cmd) != 2 or trace_cmd[1] not in ('R', 'W', b'R', b'W'):
+        raise TraceFormatError(line_number)
+    try:
+        page_number = int(trace_cmd[0], 16) >> page_offset
+    except ValueError:
+        raise TraceFormatError(line_number)
+    return page_number, trace_cmd[1] in ('W', b'W')
+
+
+def _decode_lines(lines, first_line, page_offset):
+    pages = []
+    writes = []
+    for line_number, trace_line in enumerate(lines, first_line):
+        if trace_line.strip():
+            page_number, is_write = _parse_line(trace_line, line_number, page_offset)
+            pages.append(page_number)
+            writes.append(is_write)
+    return pages, writes
+
+
+_hex_values = None
+
+
+def _hex_table(np):
+    # Lookup table from ASCII byte to hex digit value, 255 for anything else
+    global _hex_values
+    if _hex_values is None:
+        _hex_values = np.full(256, 255, dtype=np.uint8)
+        for digit in b'0123456789':
+            _hex_values[digit] = digit - ord('0')
+        for digit in b'abcdef':
+            _hex_values[digit] = _hex_values[digit - 32] = digit - ord('a') + 10
+    return _hex_values
+
+
+def _decode_fixed_width(np, block, page_offset):
+    # Vectorised decode of a block of complete lines that all have the same width
+    # ("0041f7a0 R\n", optionally with \r\n endings): the block is viewed as a 2-D
+    # byte array and the hex digits are converted column by column. Returns None
+    # if the block does not have that shape, so the caller falls back to per-line parsing.
+    data = np.frombuffer(block, dtype=np.uint8)
+    width = block.find(b'\n') + 1
+    if width < 4 or len(data) % width:
+        return None
+    rows = data.reshape(-1, width)
+    if not (rows[:, -1] == 10).all():
+        return None
+    digits = width - 4 if (rows[:, -2] == 13).all() else width - 3
+    if digits < 1 or digits > 15:
+        return None
+    if not (rows[:, digits] == 32).all():
+        return None
+
+    values = _hex_table(np)[rows[:, :digits]]
+    if (values > 15).any():
+        return None
+    modes = rows[:, digits + 1]
+    is_write = modes == ord('W')
+    if not (is_write | (modes == ord('R'))).all():
+        return None
+
+    shifts = np.arange(4 * (digits - 1), -1, -4, dtype=np.int64)
+    addresses = (values.astype(np.int64) << shifts).sum(axis=1)
+    return addresses >> page_offset, is_write
+
+
+def iter_text_chunks(stream, page_offset=12, read_size=READ_SIZE, position=None):
+    """Yields (pages, writes) chunks parsed from a binary stream of text trace lines.
+
+    With NumPy installed the chunks are int64/bool arrays and fixed-width blocks are
+    decoded without a Python loop; otherwise they are lists. If given, position is
+    a trace position (see iter_trace_chunks) advanced past each chunk before it is
+    yielded; its line count numbers the lines in error messages. The position is
+    not advanced past an unterminated last line, as it may still be being written.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    line_number = position['lines'] if position is not None else 0
+    tail = b''
+    while True:
+        block = stream.read(read_size)
+        if not block:
+            break
+        block = tail + block
+        end = block.rfind(b'\n') + 1
+        tail = block[end:]              # Incomplete last line, finished by the next block
+        block = block[:end]
+        if not block:
+            continue
+
+        decoded = _decode_fixed_width(np, block, page_offset) if np is not None else None
+        lines = block.count(b'\n')
+        if decoded is None:
+            pages, writes = _decode_lines(block.split(b'\n')[:-1], line_number + 1, page_offset)
+            if np is not None:
+                decoded = np.array(pages, dtype=np.int64), np.array(writes, dtype=bool)
+            else:
+                decoded = pages, writes
+        line_number += lines
+        if position is not None:
+            _advance(position, len(decoded[0]), len(block), lines)
+        if len(decoded[0]):
+            yield decoded
+
+    # An unterminated last line may still be being written. With a position it is
+    # yielded without advancing the position, so a later call reads it again once it
+    # is complete, and skipped if it does not parse yet
+    if tail.strip():
+        try:
+            pages, writes = _decode_lines([tail], line_number + 1, page_offset)
+        except TraceFormatError:
+            if position is None:
+                raise
+            return
+        if np is not None:
+            yield np.array(pages, dtype=np.int64), np.array(writes, dtype=bool)
+        else:
+            yield pages, writes
+
+
+def _advance(position, references, consumed, lines):
+    position['references'] += references
+    position['bytes'] += consumed
+    position['lines'] += lines
+
+
+def new_position():
+    """Returns the position at the start of a trace."""
+    return {'references': 0, 'bytes': 0, 'lines': 0}
+
+
+def _skip(stream, input_file, count):
+    # Move a trace stream past its first count bytes of (decompressed) text
+    if input_file != '-' and stream is stream.source and stream.seekable():
+        if os.path.getsize(input_file) < count:
+            raise ValueError(f"'{input_file}' is shorter than the position to continue from")
+        stream.seek(count)
+        return
+    while count:
+        skipped = len(stream.read(min(count, READ_SIZE)))
+        if not skipped:
+            raise ValueError(f"'{input_file}' is shorter than the position to continue from")
+        count -= skipped
+
+
+def trace_head_digest(input_file, size=HEAD_SIZE):
+    """Returns the SHA-256 digest of the first size bytes of trace data."""
+    with open_trace(input_file) as stream:
+        if is_binary_trace(input_file):
+            stream.read(BINARY_HEADER.size)     # The header holds the reference count
+        return hashlib.sha256(stream.read(size)).hexdigest()
+
+
+def trace_head(input_file, position):
+    """Returns (length, digest) of the start of the trace data read up to position,
+    at most HEAD_SIZE bytes, which appending to the trace does not change.
+    Binary traces cannot be appended to and always use HEAD_SIZE bytes."""
+    length = HEAD_SIZE if is_binary_trace(input_file) else min(HEAD_SIZE, position['bytes'])
+    return length, trace_head_digest(input_file, length)
+
+
+def iter_trace_chunks(input_file, page_offset=12, progress=None, position=None):
+    """Yields (pages, writes) chunks from any supported trace source with bounded memory.
+
+    Binary traces are memory-mapped; text traces are streamed from the file, a
+    compressed file or stdin. Raises TraceFormatError on a badly formatted line.
+    If given, progress is called after each chunk with the fraction of the input
+    consumed so far, or None when that is unknown (stdin).
+    If given, position (see new_position) is where reading starts, and it is
+    advanced past each chunk as the chunk is yielded, so a saved copy lets a later
+    call continue from there, e.g. onto data appended to the trace since. It is not
+    advanced past an unterminated last line, which such a call reads again.
+    """
+    if is_binary_trace(input_file):
+        start = position['references'] if position is not None else 0
+        done = start
+        for pages, writes in iter_binary_trace(input_file, page_offset, start=start):
+            done += len(pages)
+            if position is not None:
+                position['references'] = done
+            yield pages, writes
+            if progress is not None:
+                progress(done / _binary_count(input_file))
+        return
+    with open_trace(input_file) as stream:
+        total = os.path.getsize(input_file) if input_file != '-' else 0
+        if position is not None and position['bytes']:
+            _skip(stream, input_file, position['bytes'])
+        for chunk in iter_text_chunks(stream, page_offset, position=position):
+            yield chunk
+            if progress is not None:
+                progress(stream.source.tell() / total if total else None)
+
+
+def iter_pid_trace_chunks(input_file, page_offset=12, chunk_size=CHUNK_SIZE):
+    """Yields (pids, pages, writes) chunks of lists from a PID-tagged text trace.
+
+    Each line holds a decimal process ID followed by an ordinary trace line, e.g.
+    '3 0041f7a0 R'. Raises TraceFormatError on a badly formatted line.
+    """
+    pids = []
+    pages = []
+    writes = []
+    with open_trace(input_file) as stream:
+        for line_number, trace_line in enumerate(stream, 1):
+            fields = trace_line.split(None, 1)
+            if not fields:
+                continue
+            if len(fields) != 2 or not fields[0].isdigit():
+                raise TraceFormatError(line_number)
+            page_number, is_write = _parse_line(fields[1], line_number, page_offset)
+            pids.append(int(fields[0]))
+            pages.append(page_number)
+            writes.append(is_write)
+            if len(pids) == chunk_size:
+                yield pids, pages, writes
+                pids = []
+                pages = []
+                writes = []
+    if pids:
+        yield pids, pages, writes
+
+
+def _binary_count(input_file):
+    with open(input_file, 'rb') as trace_file:
+        return BINARY_HEADER.unpack(trace_file.read(BINARY_HEADER.size))[3] or 1
+
+
+def convert_text_trace(input_file, output_file, page_offset=12):
+    """Converts a text trace to the packed binary format and returns the number of references.
+
+    The trace is parsed once: page numbers are written as they are read, 4 bytes wide
+    until one needs 8, and the header is completed once the count is known.
+    """
+    width = 4
+    count = 0
+    bits = bytearray()          # Packed write flags, appended after the page numbers
+    pending = []                # Write flags not yet packed into a whole byte
+    with open_trace(input_file) as stream, open(output_file, 'w+b') as out:
+        out.write(bytes(BINARY_HEADER.size))
+        for pages, writes in iter_text_chunks(stream, page_offset):
+            if width == 4 and (pages.max() if hasattr(pages, 'dtype') else max(pages)) >= 1 << 32:
+                width = 8
+                _widen_pages(out, count)
+            _write_pages(out, pages, width)
+            count += len(pages)
+            pending.extend(writes)
+            whole = len(pending) & ~7
+            bits += _pack_bits(pending[:whole])
+            pending = pending[whole:]
+        bits += _pack_bits(pending)
+        bits_offset = out.tell()
+        out.write(bits)
+        out.seek(0)
+        out.write(BINARY_HEADER.pack(BINARY_MAGIC, page_offset, width, count, bits_offset))
+    return count
+
+
+def _widen_pages(out, count):
+    # Rewrite the count 4-byte page numbers written so far 8 bytes wide
+    out.seek(BINARY_HEADER.size)
+    pages = array('I', out.read(count * 4))
+    if sys.byteorder == 'big':
+        pages.byteswap()
+    out.seek(BINARY_HEADER.size)
+    _write_pages(out, array('Q', pages), 8)
+
+
+def write_binary_trace(output_file, chunks, count, width=4, page_offset=12):
+    """Writes (pages, writes) chunks holding count references, with page numbers
+    below 2^(8*width), as a binary trace."""
+    bits_offset = BINARY_HEADER.size + count * width
+    with open(output_file, 'wb') as out:
+        out.write(BINARY_HEADER.pack(BINARY_MAGIC, page_offset, width, count, bits_offset))
+        pages_at = BINARY_HEADER.size
+        bits_at = bits_offset
+        pending = []                # Write flags not yet packed into a whole byte
+        for pages, writes in chunks:
+            out.seek(pages_at)
+            pages_at += _write_pages(out, pages, width)
+            pending.extend(writes)
+            whole = len(pending) & ~7
+            out.seek(bits_at)
+            bits_at += out.write(_pack_bits(pending[:whole]))
+            pending = pending[whole:]
+        out.seek(bits_at)
+        out.write(_pack_bits(pending))
+
+
+def _write_pages(out, pages, width):
+    if hasattr(pages, 'dtype'):
+        return out.write(pages.astype('<u4' if width == 4 else '<u8').tobytes())
+    pages = array('I' if width == 4 else 'Q', pages)
+    if sys.byteorder == 'big':
+        pages.byteswap()
+    return out.write(pages.tobytes())
+
+
+def _pack_bits(flags):
+    # Pack write flags least significant bit first, padding the last byte with zeros
+    try:
+        import numpy as np
+        return np.packbits(np.asarray(flags, dtype=bool), bitorder='little').tobytes()
+    except ImportError:
+        pass
+    packed = bytearray((len(flags) + 7) // 8)
+    for index, is_write in enumerate(flags):
+        if is_write:
+            packed[index >> 3] |= 1 << (index & 7)
+    return bytes(packed)
+
+
+def load_binary_trace(input_file):
+    """Memory-maps a binary trace and returns (pages, write_bits, page_offset).
+
+    pages is a read-only NumPy view of the page numbers (no copy is made) and
+    write_bits the packed write flags, one bit per reference, least significant
+    bit first. Without NumPy, a memoryview over the mapping is returned instead.
+    """
+    with open(input_file, 'rb') as trace_file:
+        mapping = mmap.mmap(trace_file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, page_offset, width, count, bits_offset = BINARY_HEADER.unpack_from(mapping)
+    if magic != BINARY_MAGIC:
+        raise ValueError(f"'{input_file}' is not a binary trace")
+
+    try:
+        import numpy as np
+        pages = np.frombuffer(mapping, dtype='<u4' if width == 4 else '<u8',
+                              count=count, offset=BINARY_HEADER.size)
+        write_bits = np.frombuffer(mapping, dtype=np.uint8,
+                                   count=(count + 7) // 8, offset=bits_offset)
+    except ImportError:
+        view = memoryview(mapping)
+        pages = view[BINARY_HEADER.size:bits_offset].cast('I' if width == 4 else 'Q')
+        write_bits = view[bits_offset:bits_offset + (count + 7) // 8]
+    return pages, write_bits, page_offset
+
+
+def unpack_writes(write_bits, start, stop, as_array=False):
+    """Returns the write flags of references start..stop-1 as a list of 0/1, or as a
+    NumPy bool array if as_array is set and write_bits is a NumPy array."""
+    try:
+        import numpy as np
+        if isinstance(write_bits, np.ndarray):
+            first = start >> 3
+            bits = np.unpackbits(write_bits[first:(stop + 7) >> 3], bitorder='little')
+            bits = bits[start - (first << 3):stop - (first << 3)]
+            return bits.astype(bool) if as_array else bits.tolist()
+    except ImportError:
+        pass
+    return [(write_bits[index >> 3] >> (index & 7)) & 1 for index in range(start, stop)]
+
+
+def iter_binary_trace(input_file, page_offset=12, chunk_size=CHUNK_SIZE, start=0):
+    """Yields (pages, writes) chunks from a binary trace, shifted to page_offset,
+    beginning with reference number start."""
+    pages, write_bits, stored_offset = load_binary_trace(input_file)
+    if page_offset < stored_offset:
+        raise ValueError(f"Trace was stored with page offset {stored_offset}, cannot use {page_offset}")
+    if start > len(pages):
+        raise ValueError(f"'{input_file}' is shorter than the position to continue from")
+    shift = page_offset - stored_offset
+    for start in range(start, len(pages), chunk_size):
+        stop = min(start + chunk_size, len(pages))
+        chunk = pages[start:stop]
+        if hasattr(chunk, 'dtype'):
+            yield (chunk >> shift).astype('int64'), unpack_writes(write_bits, start, stop, True)
+        else:
+            yield [page >> shift for page in chunk], unpack_writes(write_bits, start, stop)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python tracefile.py inputfile outputfile [pageoffset]")
+    else:
+        offset = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+        converted = convert_text_trace(sys.argv[1], sys.argv[2], offset)
+        print(f"Converted {converted} references to '{sys.argv[2]}'")
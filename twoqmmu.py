@@ -0,0 +1,82 @@
+from mmu import MMU
+from collections import OrderedDict
+
+class TwoQMMU(MMU):
+    # Full 2Q (Johnson & Shasha, VLDB 1994). New pages enter the FIFO A1in; pages
+    # evicted from A1in are remembered in the ghost FIFO A1out, and a page referenced
+    # again while in A1out is promoted to the LRU list Am. Scans therefore pass through
+    # A1in without flushing the frequently used pages in Am.
+    def __init__(self, frames, kin=None, kout=None):
+        self.frames = frames                                # Number of frames in memory
+        self.kin = kin if kin is not None else max(1, frames // 4)      # Target size of A1in
+        self.kout = kout if kout is not None else max(1, frames // 2)   # Size of A1out
+        self.a1in = OrderedDict()       # Resident FIFO of new pages: page -> dirty, oldest first
+        self.a1out = OrderedDict()      # Ghost FIFO of pages evicted from A1in
+        self.am = OrderedDict()         # Resident LRU of hot pages: page -> dirty, LRU first
+        self.disk_reads = 0
+        self.disk_writes = 0
+        self.page_faults = 0
+        self.last_victim = None         # Page evicted by the latest fault, read by tracing
+        self.debug = False
+
+    def is_resident(self, page_number):
+        return page_number in self.am or page_number in self.a1in
+
+    def _reclaim(self):
+    # Free a frame if memory is full: from A1in if it is over its target size
+    # (remembering the page in A1out), otherwise the LRU page of Am.
+
+        if len(self.a1in) + len(self.am) < self.frames:
+            return
+        if len(self.a1in) > self.kin or not self.am:
+            victim, dirty = self.a1in.popitem(last=False)
+            self.a1out[victim] = None
+            if len(self.a1out) > self.kout:
+                self.a1out.popitem(last=False)
+        else:
+            victim, dirty = self.am.popitem(last=False)
+        if dirty:                                   # Write back if the victim page is dirty
+            self.disk_writes += 1
+        self.last_victim = victim
+
+    def _access(self, page_number, is_write):
+        if page_number in self.am:
+            self.am.move_to_end(page_number)
+            if is_write:
+                self.am[page_number] = True
+        elif page_number in self.a1in:              # Hits in A1in do not move the page
+            if is_write:
+                self.a1in[page_number] = True
+        else:
+            self.page_faults += 1
+            self._reclaim()
+            if page_number in self.a1out:           # Referenced again soon after eviction: hot page
+                del self.a1out[page_number]
+                self.am[page_number] = is_write
+            else:
+                self.a1in[page_number] = is_write
+            self.disk_reads += 1
+            return
+
+    def read_memory(self, page_number):
+        self._access(page_number, False)
+
+    def write_memory(self, page_number):
+        self._access(page_number, True)
+
+    def dirty_pages(self):
+    # Resident dirty pages of A1in, oldest first, then of Am, least recently used first.
+
+        return (page_number for queue in (self.a1in, self.am) for page_number, dirty in queue.items() if dirty)
+
+    def set_dirty(self, page_number, dirty):
+        (self.a1in if page_number in self.a1in else self.am)[page_number] = dirty
+
+    def get_total_disk_reads(self):
+        return self.disk_reads
+
+    def get_total_disk_writes(self):
+        return self.disk_writes
+
+    def get_total_page_faults(self):
+        return self.page_faults
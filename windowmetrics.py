@@ -0,0 +1,126 @@
+'''
+* Windowed time-series metrics of a simulation.
+* The trace is cut into windows of N references. For every window the page faults
+* and write-backs of the MMU are recorded, together with the working set W(t, N)
+* (distinct pages referenced in the window, Denning's working set with tau = N)
+* and a histogram of reuse distances. The reuse distance of a reference is its LRU
+* stack distance within the window (1 for an immediate repeat); a first reference
+* to a page in the window has none. Distances are binned in powers of two: bin k
+* counts distances in [2^k, 2^(k+1)). Cold counts the pages of the window that
+* the previous window did not reference, i.e. the pages entering the working set.
+* State is reset at every window boundary, except for the pages of the previous
+* window, so memory is O(N).
+*
+* The output is one JSON object of columns, one entry per window:
+*   {"window": N, "start": [...], "references": [...], "faults": [...],
+*    "writebacks": [...], "working_set": [...], "cold": [...],
+*    "reuse": [[bin 0 per window], [bin 1 per window], ...]}
+*
+'''
+import json
+
+
+class WindowMetrics:
+    # Wraps an MMU: process_batch feeds the MMU window by window and records metrics
+    def __init__(self, mmu, window=10000):
+        self.mmu = mmu
+        self.window = window
+        self.columns = {name: [] for name in
+                        ('start', 'references', 'faults', 'writebacks', 'working_set', 'cold')}
+        self.reuse = []                 # Columns of reuse distance bins
+        self.start = 0                  # First reference of the current window
+        self.faults = 0                 # MMU counters at the start of the window
+        self.writebacks = 0
+        self.last_use = {}
+        self._reset()
+
+    def _reset(self):
+        self.position = 0               # References seen in the window, also the last time index
+        self.previous = self.last_use.keys()    # Pages of the previous window
+        self.last_use = {}              # page -> time of its last reference in the window
+        self.tree = [0] * (self.window + 1)     # Fenwick tree over times of last references
+        self.cold = 0
+        self.histogram = []
+
+    def _observe(self, pages):
+        last_use = self.last_use
+        tree = self.tree
+        size = self.window
+        histogram = self.histogram
+        previous = self.previous
+        time = self.position
+        for page_number in pages:
+            time += 1
+            last = last_use.get(page_number)
+            if last is None:
+                if page_number not in previous:
+                    self.cold += 1
+            else:
+                # Distinct pages referenced since the last use, including this one
+                index = last
+                seen = 0
+                while index > 0:
+                    seen += tree[index]
+                    index -= index & -index
+                distance = len(last_use) - seen + 1
+                bin_number = distance.bit_length() - 1
+                while len(histogram) <= bin_number:
+                    histogram.append(0)
+                histogram[bin_number] += 1
+                index = last
+                while index <= size:
+                    tree[index] -= 1
+                    index += index & -index
+            last_use[page_number] = time
+            index = time
+            while index <= size:
+                tree[index] += 1
+                index += index & -index
+        self.position = time
+
+    def process_batch(self, pages, writes):
+        start = 0
+        while start < len(pages):
+            stop = min(len(pages), start + self.window - self.position)
+            chunk_pages = pages[start:stop]
+            self.mmu.process_batch(chunk_pages, writes[start:stop])
+            self._observe(chunk_pages.tolist() if hasattr(chunk_pages, 'tolist') else chunk_pages)
+            if self.position == self.window:
+                self._close_window()
+            start = stop
+
+    def _close_window(self):
+        faults = self.mmu.get_total_page_faults()
+        writebacks = self.mmu.get_total_disk_writes()
+        row = {'start': self.start, 'references': self.position,
+               'faults': faults - self.faults, 'writebacks': writebacks - self.writebacks,
+               'working_set': len(self.last_use), 'cold': self.cold}
+        for name, value in row.items():
+            self.columns[name].append(value)
+        windows = len(self.columns['start'])
+        while len(self.reuse) < len(self.histogram):
+            self.reuse.append([0] * (windows - 1))
+        for bin_number, column in enumerate(self.reuse):
+            column.append(self.histogram[bin_number] if bin_number < len(self.histogram) else 0)
+
+        self.start += self.position
+        self.faults = faults
+        self.writebacks = writebacks
+        self._reset()
+
+    def finish(self):
+        """Closes the last, partial window."""
+        if self.position:
+            self._close_window()
+
+    def write(self, path):
+        with open(path, 'w') as out:
+            json.dump(dict(window=self.window, **self.columns, reuse=self.reuse), out,
+                      separators=(',', ':'))
+            out.write('\n')
+
+
+def load_metrics(path):
+    """Reads a metrics file written by WindowMetrics.write."""
+    with open(path) as metrics_file:
+        return json.load(metrics_file)